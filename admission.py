@@ -0,0 +1,144 @@
+"""Admission control for the chat endpoints.
+
+At most `max_inflight` chat requests run at once, and each user may hold at most `per_user`
+slots (running or waiting). When every slot is busy, requests wait in a FIFO queue of at most
+`max_queue` entries for up to `queue_timeout` seconds. A request that can't be admitted is
+rejected right away with `AdmissionRejected`, which carries a Retry-After estimate that
+api.py turns into a 429 response.
+
+All bookkeeping happens on the event loop, so no locks are needed.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+import contextlib
+from collections import deque, defaultdict
+
+logger = logging.getLogger("file_api_logger")
+
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "32"))
+ADMISSION_PER_USER = int(os.getenv("ADMISSION_PER_USER", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request. release() gives the slot back and can safely be called more than once."""
+
+    def __init__(self, controller, user):
+        self.controller = controller
+        self.user = user
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    def __init__(self, max_inflight=ADMISSION_MAX_INFLIGHT, per_user=ADMISSION_PER_USER,
+                 max_queue=ADMISSION_MAX_QUEUE, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_inflight = max_inflight
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self._users = defaultdict(int)  # user -> running + waiting requests
+        self._waiters = deque()  # futures of queued requests, oldest first
+        self._service_time = 5.0  # moving average of request duration in seconds, for Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up: queued work spread over the running slots."""
+        backlog = (len(self._waiters) + 1) / max(self.max_inflight, 1)
+        return max(1, min(60, math.ceil(backlog * self._service_time)))
+
+    def _reject(self, reason):
+        self.rejected += 1
+        logger.warning(f"Request rejected: {reason}", extra={"api_path": "admission"})
+        raise AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, user):
+        """Wait for a slot and return a Ticket, or raise AdmissionRejected."""
+        if self._users.get(user, 0) >= self.per_user:
+            self._reject(f"user {user} already has {self.per_user} requests in flight")
+        if self.inflight < self.max_inflight and not self._waiters:
+            return self._admit(user)
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._users[user] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            self._forget(user)
+            if waiter.done() and not waiter.cancelled():
+                self._handoff()  # a slot was handed over just as the wait ended, pass it on
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            self._reject(f"no slot within {self.queue_timeout}s")
+        # the releasing request handed its slot over, inflight and the user count are already set
+        self.admitted += 1
+        return Ticket(self, user)
+
+    def _admit(self, user):
+        self.inflight += 1
+        self._users[user] += 1
+        self.admitted += 1
+        return Ticket(self, user)
+
+    def _forget(self, user):
+        self._users[user] -= 1
+        if not self._users[user]:
+            del self._users[user]
+
+    def _handoff(self):
+        """Give a freed slot to the oldest waiter (the slot stays counted in inflight)."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+
+    def _release(self, ticket):
+        self._forget(ticket.user)
+        self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - ticket.started)
+        self._handoff()
+
+    @contextlib.asynccontextmanager
+    async def admit(self, user):
+        ticket = await self.acquire(user)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self):
+        return {
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_time": round(self._service_time, 3),
+        }
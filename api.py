@@ -1,8 +1,7 @@
-from fastapi import FastAPI, HTTPException,status
-from langgraph.checkpoint.postgres import PostgresSaver
+from fastapi import FastAPI, HTTPException,status, Response, Request
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver 
 from fastapi.responses import StreamingResponse
-from mcp_custom.client import create_agent_from_session
+from mcp_custom.client import build_agent_registry, smoke_test_tools
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage
 import logging, os
@@ -12,28 +11,38 @@ import asyncio
 from typing import Annotated
 from fastapi import Depends
 from datetime import timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from checkpoint_retention import retention_loop, CHECKPOINT_RETENTION_INTERVAL
+from admission import AdmissionController, AdmissionRejected
+from starlette.background import BackgroundTask
+from sse import agent_events
 
 # Import authentication and user management functions from the auth module
 from auth import (
     Token,
-    authenticate_user,
+    aauthenticate_user,
     create_access_token,
     get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    create_user,
+    acreate_user,
     UserCreate,
-    get_db,
+    get_async_db,
+    AsyncSessionLocal,
+    async_engine,
+    pool_stats,
     UserInDB,
     require_role,
     User,
-    UserDB
+    UserDB,
+    aupdate_user,
+    ainit_db
 )
 from fastapi.security import OAuth2PasswordRequestForm
 
 app = FastAPI()
-abot = None
+agents = None  # AgentRegistry: one compiled graph per role
 
 # Make sure logs directory exists
 os.makedirs("logs", exist_ok=True)
@@ -49,88 +58,225 @@ logging.basicConfig(
 load_dotenv()
 conn = os.getenv("DATABASE_URL")
 
-memory = None
-
 class QueryRequest(BaseModel):
     query: str
     session_id : str = None
 
 import contextlib
 memory = None
-exit_stack = None
 resources = {}
-        
-@app.on_event("startup")
-async def startup_event():
-    global memory, exit_stack, abot, mcp_session_cm
-    await asyncio.sleep(2)  # Delay
-    
-    print("✅ MCP Agent ready in FastAPI")
-    try:
-        # Initialize connection to async Postgres memory
-        cm =AsyncPostgresSaver.from_conn_string(conn)
-        
-        # Keep connection open for the entire app lifecycle, solving connection closure issues
-        exit_stack = contextlib.AsyncExitStack()
-        
-        memory = await exit_stack.enter_async_context(cm)  # async context manager
-        await memory.setup()
-        
-        # Initialize the MCP client and session
-        mcp_client = MultiServerMCPClient({
-            "MyTools": {
-                "url": "http://127.0.0.1:8000/mcp",
-                "transport": "streamable_http",
-            }
-        })
-        
-        
-        # Open MCP session during startup
-        mcp_session_cm = mcp_client.session("MyTools")
-        resources["mcp_session_cm"] = mcp_session_cm
-        mcp_session = await mcp_session_cm.__aenter__()
-        print(" MCP session opened in startup")
-        
-        #create Agent with mcp session
-        abot = await create_agent_from_session(mcp_session)
-        
-        # Compile the agent with the memory
-        abot.compile(memory)
-        
-        logging.info("Async Postgres memory initialized and agent compiled successfully.")
-        
-        
-        # Get database session
-        db = next(get_db())
-        
+
+MCP_URL = os.getenv("MCP_URL", "http://127.0.0.1:8000/mcp")
+# Dependencies are retried with exponential backoff, from DEPENDENCY_RETRY_DELAY up to DEPENDENCY_RETRY_MAX_DELAY seconds
+DEPENDENCY_RETRY_DELAY = float(os.getenv("DEPENDENCY_RETRY_DELAY", "0.25"))
+DEPENDENCY_RETRY_MAX_DELAY = float(os.getenv("DEPENDENCY_RETRY_MAX_DELAY", "30"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))  # seconds between pings of Postgres and the MCP server
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "60"))
+
+# Live status of each dependency for /readyz, kept up to date by the dependencies task;
+# warmup runs in the background and is not required
+dependencies = {"postgres": "starting", "users_db": "starting", "mcp": "starting", "agents": "starting", "warmup": "pending"}
+REQUIRED_DEPENDENCIES = ["postgres", "users_db", "mcp", "agents"]
+
+
+def is_ready():
+    return agents is not None and all(dependencies[name] == "ok" for name in REQUIRED_DEPENDENCIES)
+
+
+async def retry_forever(name, connect):
+    """Await `connect()` until it succeeds, with capped exponential backoff. dependencies[name] shows the last error."""
+    delay = DEPENDENCY_RETRY_DELAY
+    while True:
+        try:
+            result = await connect()
+        except Exception as e:
+            dependencies[name] = f"unavailable: {e!r}"
+            logging.warning(f"{name} not available: {e!r}, retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DEPENDENCY_RETRY_MAX_DELAY)
+            continue
+        dependencies[name] = "ok"
+        return result
+
+
+async def open_checkpointer(stack):
+    """
+    Open the async Postgres checkpointer; the connection stays open until `stack` is closed.
+    Each attempt opens it on its own stack, handed over to `stack` once setup() succeeded,
+    so a failed attempt closes its connection right away.
+    """
+    async with contextlib.AsyncExitStack() as attempt:
+        saver = await attempt.enter_async_context(AsyncPostgresSaver.from_conn_string(conn))
+        await saver.setup()
+        stack.push_async_exit(attempt.pop_all())
+    return saver
+
+
+async def ping_checkpointer(saver):
+    """Round trip on the checkpointer's connection, under its lock (the agents share the connection)."""
+    async with saver.lock:
+        await saver.conn.execute("SELECT 1")
+
+
+async def init_users_db():
+    """Create the users table if needed and make sure the admin user exists."""
+    await ainit_db()
+    # Get database session (closed and returned to the pool at the end of the block)
+    async with AsyncSessionLocal() as db:
         # Ensure admin user exists, create if not
         admin_email = "admin@test.com"
-        existing_admin = db.query(UserDB).filter(UserDB.email == admin_email).first()
+        existing_admin = (await db.execute(select(UserDB).where(UserDB.email == admin_email))).scalar_one_or_none()
         if not existing_admin:
-            create_user(db, UserCreate(username="admin", email=admin_email, password="AdminPass", role="admin"))
+            await acreate_user(db, UserCreate(username="admin", email=admin_email, password="AdminPass"), role="admin")
             logging.info("✅ Admin user created successfully.")
+        elif existing_admin.role != "admin":
+            # created before users had roles
+            await aupdate_user(db, existing_admin.username, role="admin")
+            logging.info("✅ Admin user promoted to the admin role.")
         else:
             logging.info("✅ Admin user already exists.")
-            
-    except Exception as e:
-        logging.error(f"Failed to initialize Async Postgres memory: {e}")
+
+
+async def open_mcp_session(stack):
+    """Open a session to the MCP server at MCP_URL; it is closed with `stack`."""
+    mcp_client = MultiServerMCPClient({
+        "MyTools": {
+            "url": MCP_URL,
+            "transport": "streamable_http",
+        }
+    })
+    return await stack.enter_async_context(mcp_client.session("MyTools"))
+
+
+async def connect_agents():
+    """Open an MCP session and compile one agent per role on it. Returns (session stack, session, registry)."""
+    stack = contextlib.AsyncExitStack()
+    try:
+        mcp_session = await open_mcp_session(stack)
+        registry = await build_agent_registry(mcp_session, memory)
+    except BaseException:
+        await stack.aclose()
         raise
+    return stack, mcp_session, registry
+
+
+async def watch_dependencies(mcp_session):
+    """Ping Postgres and the MCP server every HEALTH_CHECK_INTERVAL seconds. Returns the name of the first one that stops answering."""
+    pings = {"postgres": lambda: ping_checkpointer(memory), "mcp": lambda: mcp_session.send_ping()}
+    while True:
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+        for name, ping in pings.items():
+            try:
+                await asyncio.wait_for(ping(), timeout=HEALTH_CHECK_INTERVAL)
+            except Exception as e:
+                dependencies[name] = f"unavailable: {e!r}"
+                logging.warning(f"{name} stopped answering: {e!r}, reconnecting")
+                return name
+
+
+async def warmup(registry):
+    """Tool smoke tests, off the startup path. They also warm the MCP server's price and search caches."""
+    dependencies["warmup"] = "running"
+    try:
+        await asyncio.wait_for(smoke_test_tools(registry.tools), timeout=WARMUP_TIMEOUT)
+        dependencies["warmup"] = "ok"
+        logging.info("Warmup finished.")
+    except Exception as e:
+        dependencies["warmup"] = f"failed: {e!r}"
+        logging.error(f"Warmup failed: {e!r}")
+
+
+async def cancel_task(task):
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+async def run_dependencies():
+    """
+    Background task started at startup: connects every dependency (retrying until it is reachable),
+    keeps `dependencies` up to date for /readyz and reconnects to Postgres or the MCP server when it goes away.
+    It owns the checkpointer connection and the MCP session, both are closed when it is cancelled.
+    """
+    global memory, agents
+    async with contextlib.AsyncExitStack() as stack:
+        await retry_forever("users_db", init_users_db)
+
+        # Periodically drop old checkpoints and idle threads (on its own connection)
+        if CHECKPOINT_RETENTION_INTERVAL > 0:
+            stack.push_async_callback(cancel_task, asyncio.create_task(retention_loop(conn)))
+
+        while True:
+            async with contextlib.AsyncExitStack() as postgres_stack:
+                memory = await retry_forever("postgres", lambda: open_checkpointer(postgres_stack))
+                logging.info("Async Postgres memory initialized.")
+
+                failed = "mcp"
+                while failed == "mcp":
+                    mcp_stack, mcp_session, registry = await retry_forever("mcp", connect_agents)
+                    async with mcp_stack:
+                        agents = registry
+                        dependencies["agents"] = "ok"
+                        logging.info(f"MCP session opened and agents compiled for roles: {agents.roles()}")
+                        # tool smoke tests don't hold up readiness
+                        warmup_task = asyncio.create_task(warmup(registry))
+                        try:
+                            failed = await watch_dependencies(mcp_session)
+                        finally:
+                            # unready until the agents are rebuilt on a new session
+                            agents = None
+                            dependencies["agents"] = "starting"
+                            await cancel_task(warmup_task)
+                # Postgres went away: the agents are rebuilt on a new checkpointer connection
+                memory = None
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Returns right away so the server accepts connections (/healthz, /readyz) while the
+    # dependencies connect; /chat and /chat/stream answer 503 until they are ready
+    resources["dependencies_task"] = asyncio.create_task(run_dependencies())
+    print("✅ FastAPI started, connecting dependencies in the background")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    global exit_stack
-    
-    # Close MCP session properly during shutdown
-    if resources.get("mcp_session_cm"):
-        await resources["mcp_session_cm"].__aexit__(None, None, None)
-        logging.info("MCP session closed.")
-        
-    # Properly close the async Postgres connection on shutdown
-    if exit_stack:
-        await exit_stack.aclose()
-        logging.info("Async memory connection closed.")
+    # Stops the background work and closes the MCP session and the checkpointer connection
+    if resources.get("dependencies_task"):
+        await cancel_task(resources["dependencies_task"])
+        logging.info("MCP session and async memory connection closed.")
+
+    # Close the users DB connection pool
+    await async_engine.dispose()
+
+
+def ready_agents():
+    """The per-role agents, or 503 with Retry-After while the dependencies are (re)connecting."""
+    if not is_ready():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is starting, the agents are not ready yet",
+            headers={"Retry-After": "5"},
+        )
+    return agents
         
 
+# Global and per-user limits on concurrent chat requests (admission.py)
+admission = AdmissionController()
+
+
+async def admit(username: str):
+    """Wait for a chat slot, or answer 429 with Retry-After when none is available in time."""
+    try:
+        return await admission.acquire(username)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests: {e.reason}",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 def get_session_id(session_id: str = None):
     # Generate a new session ID if not provided
     return session_id or str(uuid.uuid4())
@@ -138,13 +284,13 @@ def get_session_id(session_id: str = None):
 
 # Endpoint to register a new user in the database
 @app.post("/signup")
-async def signup(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
+async def signup(user: UserCreate, db: Annotated[AsyncSession, Depends(get_async_db)]):
     """
     Create a new user account in the PostgreSQL database.
     """
     try:
         # Save new user to the database and return the username
-        created_username = create_user(db, user)
+        created_username = await acreate_user(db, user)
         logging.info(f"User created: {created_username}")
         return {"message": f"User {created_username} created successfully"}
     except HTTPException as e:
@@ -158,9 +304,9 @@ async def signup(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
 @app.post("/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> Token:
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await aauthenticate_user(db, form_data.username, form_data.password)
     
     # Raise error if authentication fails
     if not user:
@@ -186,6 +332,8 @@ async def chat_endpoint(req: QueryRequest, current_user=Depends(get_current_acti
     """
     Standard (non-streaming) chat endpoint.
     """
+    registry = ready_agents()
+    ticket = await admit(current_user.username)
     try:
         # Use provided session_id or generate a new one
         session_id = get_session_id(req.session_id)
@@ -193,7 +341,8 @@ async def chat_endpoint(req: QueryRequest, current_user=Depends(get_current_acti
         config = {"configurable": {"thread_id": session_id}}
         # Create message from user query
         messages = [HumanMessage(content=req.query)]
-        # Invoke the agent (sync)
+        # Invoke the agent compiled for the user's role
+        abot = registry.get(current_user.role)
         result = await abot.graph.ainvoke({"messages": messages}, config)
         # Extract the response content
         response = result["messages"][-1].content
@@ -202,40 +351,94 @@ async def chat_endpoint(req: QueryRequest, current_user=Depends(get_current_acti
     except Exception as e:
         logging.error(f"Error during chat request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        ticket.release()
 
 
 # ----- Streaming Chat Endpoint -----
 # Requires a valid JWT token to access this endpoint
 # The authenticated user is extracted via dependency injection
 @app.post("/chat/stream")
-async def chat_stream(req: QueryRequest, current_user=Depends(get_current_active_user)):
+async def chat_stream(req: QueryRequest, request: Request, format: str = "text", current_user=Depends(get_current_active_user)):
     """
     Streaming chat endpoint.
     Streams partial responses (chunks) from the model as they are generated.
+    With ?format=sse (or Accept: text/event-stream) it sends typed Server-Sent Events
+    instead: tokens, tool start/end with durations, a final summary and errors (see sse.py).
     """
     session_id = get_session_id(req.session_id)
     config = {"configurable": {"thread_id": session_id}}
     messages = [HumanMessage(content=req.query)]
+    # Agent compiled for the user's role (tools allowed for that role), 503 while not ready
+    abot = ready_agents().get(current_user.role)
+    # Admitted before the response starts, so a rejection is still a real 429;
+    # the slot is held until the stream ends
+    ticket = await admit(current_user.username)
+
+    if format == "sse" or "text/event-stream" in request.headers.get("accept", ""):
+        async def sse_generator():
+            try:
+                async for message in agent_events(abot.graph, {"messages": messages}, config, session_id):
+                    yield message
+            finally:
+                ticket.release()
+
+        return StreamingResponse(
+            sse_generator(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # no proxy buffering
+            background=BackgroundTask(ticket.release),
+        )
 
     async def event_generator():
         """Yields model output chunks for StreamingResponse."""
         
         try:
+            streamed = False  # whether the current LLM call streamed any tokens
             # Stream LangGraph events asynchronously
             async for event in abot.graph.astream_events({"messages": messages}, config):
-                if event["event"] == "on_chat_model_stream":
+                # only the agent's answer, not the history summary or LLM calls made inside tools
+                if event["metadata"].get("langgraph_node") != "llm":
+                    continue
+                if event["event"] == "on_chat_model_start":
+                    streamed = False
+                elif event["event"] == "on_chat_model_stream":
                     chunk = event["data"]["chunk"].content
                     if chunk:
+                        streamed = True
                         # Yield each chunk of the response immediately
                         yield chunk
+                elif event["event"] == "on_chat_model_end" and not streamed:
+                    # the model didn't stream (e.g. a non-streaming model), send its answer whole
+                    content = event["data"]["output"].content
+                    if content:
+                        yield content
             yield "\n"  # End of stream
         except Exception as e:
             logging.error(f"Error during streaming chat: {e}",exc_info=True)  # exc_info=True ensures full traceback is logged
             yield f"\n[Error]: {e}\n"
+        finally:
+            ticket.release()
             
             
     # StreamingResponse sends chunks to the client as they are yielded
-    return StreamingResponse(event_generator(), media_type="text/plain")
+    # (the background task also frees the slot if the client disconnects before the stream starts)
+    return StreamingResponse(event_generator(), media_type="text/plain", background=BackgroundTask(ticket.release))
+
+# Liveness: the process is up and serving requests
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+# Readiness: 503 unless every required dependency is up right now, with the live status of each
+@app.get("/readyz")
+async def readyz(response: Response):
+    ready = is_ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready, "dependencies": dependencies, "db_pool": pool_stats(), "admission": admission.stats()}
+
 
 @app.get("/")
 def home(query: str = ""):
@@ -0,0 +1,193 @@
+"""Retention and compaction of the LangGraph Postgres checkpoint tables.
+
+Every graph step writes a checkpoint, so `checkpoints`, `checkpoint_writes` and
+`checkpoint_blobs` grow with every message. This module:
+
+- deletes threads whose latest checkpoint is older than `idle_ttl` (all three tables),
+- keeps only the latest `keep_last` checkpoints of every other thread, with their writes,
+- deletes blobs no longer referenced by any remaining checkpoint of the thread (blobs newer than
+  the thread's latest checkpoint are kept, they may belong to a checkpoint being written),
+
+in batches of `batch_size` threads, each batch in its own short transaction.
+
+Run it from the CLI (e.g. from cron):
+
+    python checkpoint_retention.py --keep-last 20 --idle-days 30 --vacuum
+
+or let api.py run `retention_loop` as a background task (CHECKPOINT_RETENTION_INTERVAL).
+
+Old checkpoints can be dropped because the agent's channels store full values in each
+checkpoint; the latest one alone is enough to resume a thread.
+"""
+import os
+import asyncio
+import logging
+import argparse
+from datetime import timedelta
+
+import psycopg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("file_api_logger")
+
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_THREAD_TTL_DAYS = float(os.getenv("CHECKPOINT_THREAD_TTL_DAYS", "30"))
+CHECKPOINT_RETENTION_INTERVAL = int(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "3600"))  # seconds, 0 disables the task
+CHECKPOINT_RETENTION_BATCH = int(os.getenv("CHECKPOINT_RETENTION_BATCH", "500"))
+
+# Candidates are selected once per pass (one scan of the table), then re-checked batch by batch
+# on the primary key, so a thread that became active in between is kept
+IDLE_THREADS_SQL = """
+SELECT thread_id FROM checkpoints
+GROUP BY thread_id
+HAVING max((checkpoint->>'ts')::timestamptz) < now() - %(ttl)s
+"""
+
+STILL_IDLE_SQL = """
+SELECT thread_id FROM checkpoints
+WHERE thread_id = ANY(%(threads)s)
+GROUP BY thread_id
+HAVING max((checkpoint->>'ts')::timestamptz) < now() - %(ttl)s
+"""
+
+DELETE_THREADS_SQL = [
+    "DELETE FROM checkpoint_writes WHERE thread_id = ANY(%(threads)s)",
+    "DELETE FROM checkpoint_blobs WHERE thread_id = ANY(%(threads)s)",
+    "DELETE FROM checkpoints WHERE thread_id = ANY(%(threads)s)",
+]
+
+# Threads with more than keep_last checkpoints (in any namespace), selected once per pass like the idle
+# threads; each batch then deletes by primary key (thread_id = ANY(...)), so a thread that no longer
+# has more than keep_last checkpoints loses nothing
+LONG_THREADS_SQL = """
+SELECT DISTINCT thread_id FROM (
+    SELECT thread_id FROM checkpoints
+    GROUP BY thread_id, checkpoint_ns
+    HAVING count(*) > %(keep)s
+) long_threads
+ORDER BY thread_id
+"""
+
+# checkpoint ids are time-ordered, so the latest checkpoints have the largest ids
+DELETE_OLD_CHECKPOINTS_SQL = """
+DELETE FROM checkpoints c USING (
+    SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+        SELECT thread_id, checkpoint_ns, checkpoint_id,
+               row_number() OVER (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn
+        FROM checkpoints WHERE thread_id = ANY(%(threads)s)
+    ) ranked WHERE rn > %(keep)s
+) old
+WHERE c.thread_id = old.thread_id AND c.checkpoint_ns = old.checkpoint_ns AND c.checkpoint_id = old.checkpoint_id
+"""
+
+DELETE_ORPHAN_WRITES_SQL = """
+DELETE FROM checkpoint_writes w
+WHERE w.thread_id = ANY(%(threads)s) AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id
+)
+"""
+
+# The saver writes a checkpoint's new blobs before the checkpoint row itself (autocommit), so a blob
+# newer than the latest checkpoint's version of its channel may belong to a checkpoint being written
+# right now and is kept. Versions are zero-padded strings, so they compare as text.
+DELETE_ORPHAN_BLOBS_SQL = """
+DELETE FROM checkpoint_blobs b
+WHERE b.thread_id = ANY(%(threads)s) AND b.version <= (
+    SELECT c.checkpoint -> 'channel_versions' ->> b.channel FROM checkpoints c
+    WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+    ORDER BY c.checkpoint_id DESC LIMIT 1
+) AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c, jsonb_each_text(c.checkpoint -> 'channel_versions') cv
+    WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+      AND cv.key = b.channel AND cv.value = b.version
+)
+"""
+
+
+async def expire_idle_threads(conn, idle_ttl, batch_size=CHECKPOINT_RETENTION_BATCH):
+    """Delete every thread whose latest checkpoint is older than `idle_ttl`. Returns the number of threads."""
+    total = 0
+    candidates = [row[0] for row in await (await conn.execute(IDLE_THREADS_SQL, {"ttl": idle_ttl})).fetchall()]
+    for i in range(0, len(candidates), batch_size):
+        async with conn.transaction():
+            rows = await (await conn.execute(STILL_IDLE_SQL, {"threads": candidates[i:i + batch_size], "ttl": idle_ttl})).fetchall()
+            threads = [row[0] for row in rows]
+            if not threads:
+                continue
+            for sql in DELETE_THREADS_SQL:
+                await conn.execute(sql, {"threads": threads})
+        total += len(threads)
+        logger.info(f"Expired {len(threads)} idle threads", extra={"api_path": "checkpoint_retention"})
+    return total
+
+
+async def compact_threads(conn, keep_last, batch_size=CHECKPOINT_RETENTION_BATCH):
+    """Keep the latest `keep_last` checkpoints per thread. Returns the number of deleted checkpoints."""
+    total = 0
+    candidates = [row[0] for row in await (await conn.execute(LONG_THREADS_SQL, {"keep": keep_last})).fetchall()]
+    for i in range(0, len(candidates), batch_size):
+        threads = candidates[i:i + batch_size]
+        async with conn.transaction():
+            deleted = (await conn.execute(DELETE_OLD_CHECKPOINTS_SQL, {"threads": threads, "keep": keep_last})).rowcount
+            await conn.execute(DELETE_ORPHAN_WRITES_SQL, {"threads": threads})
+            await conn.execute(DELETE_ORPHAN_BLOBS_SQL, {"threads": threads})
+        total += deleted
+        logger.info(f"Compacted {len(threads)} threads, {deleted} checkpoints deleted", extra={"api_path": "checkpoint_retention"})
+    return total
+
+
+async def run_retention(conn_string, keep_last=CHECKPOINT_KEEP_LAST, idle_ttl=timedelta(days=CHECKPOINT_THREAD_TTL_DAYS),
+                        batch_size=CHECKPOINT_RETENTION_BATCH, vacuum=False):
+    """One retention pass on a dedicated connection (not the saver's). Returns a dict of counts."""
+    async with await psycopg.AsyncConnection.connect(conn_string, autocommit=True) as conn:
+        threads = await expire_idle_threads(conn, idle_ttl, batch_size)
+        checkpoints = await compact_threads(conn, keep_last, batch_size)
+        if vacuum:
+            # VACUUM can't run inside a transaction, the connection is in autocommit mode
+            await conn.execute("VACUUM (ANALYZE) checkpoints, checkpoint_writes, checkpoint_blobs")
+    stats = {"expired_threads": threads, "deleted_checkpoints": checkpoints}
+    logger.info(f"Checkpoint retention done: {stats}", extra={"api_path": "checkpoint_retention"})
+    return stats
+
+
+async def retention_loop(conn_string, interval=CHECKPOINT_RETENTION_INTERVAL, **kwargs):
+    """Run `run_retention` every `interval` seconds until cancelled (background task for api.py)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_retention(conn_string, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Checkpoint retention failed: {e}", extra={"api_path": "checkpoint_retention"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete old LangGraph checkpoints and idle threads.")
+    parser.add_argument("--keep-last", type=int, default=CHECKPOINT_KEEP_LAST, help="checkpoints kept per thread")
+    parser.add_argument("--idle-days", type=float, default=CHECKPOINT_THREAD_TTL_DAYS, help="delete threads idle for longer")
+    parser.add_argument("--batch-size", type=int, default=CHECKPOINT_RETENTION_BATCH, help="threads per delete transaction")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) the checkpoint tables afterwards")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    stats = asyncio.run(run_retention(
+        args.database_url,
+        keep_last=args.keep_last,
+        idle_ttl=timedelta(days=args.idle_days),
+        batch_size=args.batch_size,
+        vacuum=args.vacuum,
+    ))
+    print(f"Expired {stats['expired_threads']} threads, deleted {stats['deleted_checkpoints']} checkpoints.")
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())  # for psycopg
+    main()
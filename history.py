@@ -0,0 +1,144 @@
+"""Token budget for the conversation history sent to the agent's LLM.
+
+The checkpointed `messages` keep the full conversation. Before each user turn, the
+`trim` node checks how many tokens the not-yet-summarized part of the history takes;
+above `max_tokens`, everything but the most recent turns (about `keep_tokens`) is folded
+into a running summary stored in the state (`summary`, `summary_upto`). The LLM node
+then sends: system prompt + summary + recent messages, with tool outputs of earlier turns
+truncated to `old_tool_tokens`.
+"""
+import os
+import json
+import logging
+
+import tiktoken
+from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
+
+logger = logging.getLogger("file_api_logger")
+
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "4000"))
+HISTORY_KEEP_TOKENS = int(os.getenv("HISTORY_KEEP_TOKENS", "2000"))
+OLD_TOOL_MESSAGE_TOKENS = int(os.getenv("OLD_TOOL_MESSAGE_TOKENS", "300"))
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below for an assistant that will continue it. Keep facts, "
+    "numbers, names, user preferences and open questions; drop small talk. "
+    "Extend the existing summary if there is one.\n\n"
+    "Existing summary:\n{summary}\n\nConversation:\n{conversation}"
+)
+
+_encoding = None
+
+
+def _get_encoding():
+    """Load the tokenizer on first use (tiktoken may download it), None if it can't be loaded."""
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4o / gpt-4o-mini
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, estimating tokens from characters: {e}", extra={"api_path": "history"})
+            _encoding = False
+    return _encoding or None
+
+
+def _count(text):
+    encoding = _get_encoding()
+    return len(encoding.encode(text)) if encoding else len(text) // 4 + 1
+
+
+def _text(message):
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        text += json.dumps([{"name": t["name"], "args": t["args"]} for t in tool_calls])
+    return text
+
+
+def count_tokens(messages):
+    """Approximate prompt tokens of `messages` (content + tool calls + ~4 tokens framing each)."""
+    return sum(_count(_text(m)) + 4 for m in messages)
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if not encoding:
+        if len(text) <= 4 * max_tokens:
+            return text
+        return text[:4 * max_tokens] + f" ...[truncated {len(text) - 4 * max_tokens} chars]"
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + f" ...[truncated {len(tokens) - max_tokens} tokens]"
+
+
+def last_turn_start(messages):
+    """Index of the last HumanMessage (start of the current turn), 0 if there is none."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return i
+    return 0
+
+
+class HistoryTrimmer:
+    def __init__(self, model, max_tokens=HISTORY_MAX_TOKENS, keep_tokens=HISTORY_KEEP_TOKENS,
+                 old_tool_tokens=OLD_TOOL_MESSAGE_TOKENS):
+        self.model = model  # used for summaries, without tools bound
+        self.max_tokens = max_tokens
+        self.keep_tokens = keep_tokens
+        self.old_tool_tokens = old_tool_tokens
+
+    # --- prompt side (used by the llm node) ---
+    def window(self, state):
+        """Messages to send to the LLM: summary + unsummarized messages, old tool outputs truncated."""
+        messages = state['messages'][state.get('summary_upto', 0):]
+        current = last_turn_start(messages)
+        window = [
+            ToolMessage(tool_call_id=m.tool_call_id, name=m.name, content=truncate_tokens(str(m.content), self.old_tool_tokens))
+            if isinstance(m, ToolMessage) and i < current else m
+            for i, m in enumerate(messages)
+        ]
+        if state.get('summary'):
+            window = [SystemMessage(content=f"Summary of the earlier conversation:\n{state['summary']}")] + window
+        return window
+
+    # --- trim node ---
+    def _cut(self, state):
+        """Return the index up to which messages should be summarized, or None if within budget."""
+        start = state.get('summary_upto', 0)
+        messages = state['messages']
+        if count_tokens(self.window(state)) <= self.max_tokens:
+            return None
+        # Cut only before a HumanMessage, so an AIMessage is never separated from its ToolMessages
+        cut = None
+        kept = 0
+        for i in range(len(messages) - 1, start, -1):
+            kept += count_tokens([messages[i]])
+            if isinstance(messages[i], HumanMessage):
+                if kept > self.keep_tokens and cut is not None:
+                    break
+                cut = i
+        return cut if cut is not None and cut > start else None
+
+    def _summary_prompt(self, state, cut):
+        lines = []
+        for m in state['messages'][state.get('summary_upto', 0):cut]:
+            text = truncate_tokens(str(m.content), self.old_tool_tokens) if isinstance(m, ToolMessage) else _text(m)
+            lines.append(f"{m.type}: {text}")
+        return SUMMARY_PROMPT.format(summary=state.get('summary') or "(none)", conversation="\n".join(lines))
+
+    def trim(self, state):
+        cut = self._cut(state)
+        if cut is None:
+            return {}
+        summary = self.model.invoke([HumanMessage(content=self._summary_prompt(state, cut))]).content
+        logger.info(f"History summarized up to message {cut}", extra={"api_path": "history"})
+        return {'summary': summary, 'summary_upto': cut}
+
+    async def atrim(self, state):
+        cut = self._cut(state)
+        if cut is None:
+            return {}
+        summary = (await self.model.ainvoke([HumanMessage(content=self._summary_prompt(state, cut))])).content
+        logger.info(f"History summarized up to message {cut}", extra={"api_path": "history"})
+        return {'summary': summary, 'summary_upto': cut}
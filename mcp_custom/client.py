@@ -1,59 +1,109 @@
-from async_graph import Agent
+from graph import Agent
 from langchain_openai import ChatOpenAI
 from langchain_mcp_adapters.tools import load_mcp_tools
-from sqlalchemy.orm import Session
+from tools.llm_cache import llm_cache
 
 # Initialize the language model (OpenAI GPT-4o-mini)
-model = ChatOpenAI(model="gpt-4o-mini")
+# not cached: its answer is streamed, and a cache hit would reach /chat/stream without any tokens;
+# stream_usage makes streamed responses report their token usage (SSE `final` event)
+model = ChatOpenAI(model="gpt-4o-mini", stream_usage=True)
+# history summaries are never streamed to the client and may come from the response cache
+summary_model = ChatOpenAI(model="gpt-4o-mini", cache=llm_cache)
 
-async def create_agent_from_session(session, db: Session, username: str, role: str):
+# Tools available to each role, None means every tool served by the MCP server
+ROLE_TOOLS = {
+    "admin": None,
+    "user": ["get_price"],
+}
+DEFAULT_ROLE = "user"
+
+
+def tools_for_role(tools, role):
+    """Filter the MCP tools down to the ones `role` may use (unknown roles get the default role's tools)."""
+    allowed_tool_names = ROLE_TOOLS.get(role, ROLE_TOOLS[DEFAULT_ROLE])
+    if allowed_tool_names is None:
+        return tools
+    return [tool for tool in tools if tool.name in allowed_tool_names]
+
+
+async def smoke_test_tools(tools):
+    """Call 'safe_tavily' and 'get_price' once to verify the MCP tools are working."""
+    tools_by_name = {tool.name: tool for tool in tools}
+    if "safe_tavily" in tools_by_name:
+        print(await tools_by_name["safe_tavily"].ainvoke(input={"query": "LA weather"}))
+    if "get_price" in tools_by_name:
+        print(await tools_by_name["get_price"].ainvoke(input={"slug": "bitcoin"}))
+
+
+class AgentRegistry:
+    """One compiled agent graph per role, built once at startup and shared by all requests."""
+
+    def __init__(self, agents, session=None, tools=None):
+        self.agents = agents
+        self.tools = tools or []  # every MCP tool, for warmup
+        # MCP session the tools are bound to, kept for clean shutdown (FastAPI app)
+        self._mcp_session = session
+
+    def get(self, role):
+        """Agent for `role`, falling back to the default role for unknown roles."""
+        return self.agents.get(role) or self.agents[DEFAULT_ROLE]
+
+    def roles(self):
+        return list(self.agents)
+
+
+async def create_agent_from_session(session, role: str = DEFAULT_ROLE, tools=None):
     """
     Create an agent from an existing MCP session.
 
     This function:
-    - Loads all available tools from the given MCP session
+    - Loads all available tools from the given MCP session (unless `tools` is given)
+    - Keeps the tools allowed for `role`
     - Initializes an Agent with the specified language model and tools
-    - Performs a quick test call to verify MCP tools are working
-    - Returns the configured Agent instance
+    - Returns the configured (not yet compiled) Agent instance
 
     Args:
         session: An active MCP session object
+        role: Role whose tools the agent gets (see ROLE_TOOLS)
 
     Returns:
         Agent: Configured Agent instance with MCP tools
     """
-    
+
     # Load available tools from the MCP session
-    tools = await load_mcp_tools(session)
-    print("✅ Tools loaded:", [tool.name for tool in tools])
-      
+    if tools is None:
+        tools = await load_mcp_tools(session)
+        print("✅ Tools loaded:", [tool.name for tool in tools])
+
     # Filter tools based on role
-    if role == "admin":
-        allowed_tools = tools   #admin
-    else:
-        #user
-        allowed_tool_names = ["get_price"]
-        allowed_tools = [tool for tool in tools if tool.name in allowed_tool_names]
-        
-        print(f"✅ Tools loaded for user {username} (role: {role}): {[tool.name for tool in allowed_tools]}")
-    for tool in allowed_tools:
-        print(f"Tool: {tool.name}")
-    # Create an Agent instance with model and tools
+    allowed_tools = tools_for_role(tools, role)
+    print(f"✅ Tools for role {role}: {[tool.name for tool in allowed_tools]}")
+
+    # Create an Agent instance with model and tools (binds the tool schemas to the model once)
     agent = Agent(
         model=model,
         tools=allowed_tools,
         system="You are a helpful assistant",
+        summary_model=summary_model,
     )
-    
+
     # Attach MCP session to the agent for clean shutdown later (for FastAPI app)
     agent._mcp_session = session
-    
-    # Quick test: Call the 'safe_tavily' tool with a sample query
-    tav = next(t for t in tools if t.name == "safe_tavily")
-    print(await tav.ainvoke(input={"query": "LA weather"}))
-
-    # Quick test: Call the 'get_price' tool for Bitcoin price
-    price_tool = next(t for t in tools if t.name == "get_price")
-    print(await price_tool.ainvoke(input={"slug": "bitcoin"}))
-    
-    return agent
\ No newline at end of file
+    return agent
+
+
+async def build_agent_registry(session, memory, roles=None):
+    """
+    Load the MCP tools once, then build and compile one agent graph per role,
+    all sharing the same checkpointer.
+    No tool is called here, see smoke_test_tools for the warmup.
+    """
+    tools = await load_mcp_tools(session)
+    print("✅ Tools loaded:", [tool.name for tool in tools])
+
+    agents = {}
+    for role in roles or ROLE_TOOLS:
+        agent = await create_agent_from_session(session, role=role, tools=tools)
+        agent.compile(memory)
+        agents[role] = agent
+    return AgentRegistry(agents, session=session, tools=tools)
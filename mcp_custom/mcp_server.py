@@ -3,6 +3,8 @@ from langchain_tool_to_mcp_adapter import add_langchain_tool_to_server
 
 import sys
 import os
+import inspect
+import typing
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 # Import custom  langchain tools
 from tools.tools import TOOLs
@@ -10,10 +12,36 @@ from tools.tools import TOOLs
 # Create an MCP server instance with a custom name
 mcp = FastMCP("MyTools")
 
+
+def add_async_tool_to_server(server, tool):
+    """
+    Register a LangChain tool that has a coroutine as an async MCP tool.
+
+    The adapter only knows `tool.func`, which would run the sync version on the
+    server's event loop. Here the tool's `ainvoke` is awaited instead. Injected
+    arguments (rag_qa's session_id) stay in the MCP schema as plain arguments,
+    the client-side agent fills them in.
+    """
+    signature = inspect.signature(tool.coroutine)
+    params = [
+        p.replace(annotation=typing.get_args(p.annotation)[0]) if typing.get_origin(p.annotation) is typing.Annotated else p
+        for p in signature.parameters.values()
+    ]
+
+    async def run(**kwargs):
+        return await tool.ainvoke(kwargs)
+
+    run.__signature__ = signature.replace(parameters=params)
+    server.add_tool(run, name=tool.name, description=tool.description)
+
+
 # Register each LangChain tool with the MCP server
 for t in TOOLs:
     print(f"MCP tool registered: {t.name}")
-    add_langchain_tool_to_server(mcp, t)
+    if getattr(t, "coroutine", None):
+        add_async_tool_to_server(mcp, t)
+    else:
+        add_langchain_tool_to_server(mcp, t)
     
 if __name__ == "__main__":
     
@@ -1,8 +1,8 @@
 import streamlit as st
-import requests
-import time
 import uuid
 
+from sse_client import stream_chat
+
 # --- If the user is not logged in, show warning and login button ---
 if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
     st.warning("Please login first.")
@@ -37,25 +37,24 @@ if "session_id" not in st.session_state:
 user_input = st.text_input("Enter your question:", placeholder="Type here...")
 
 # --- API endpoint configuration ---
-url = "http://localhost:8000/chat/stream"
-data = {
-        "query": user_input,
-        "session_id": st.session_state.session_id
-    }
-headers = {
-    "Authorization": f"Bearer {st.session_state['access_token']}"
-}   
+base_url = "http://localhost:8000"
 placeholder = st.empty() #create an empty space
+status = st.empty() # tool progress and timings
 
-# --- Send the request and stream the response ---
-r = requests.post(url, json = data,headers=headers, stream=True)
-response_text  = ""
-for chunk in r.iter_content(chunk_size=1024):
-    if chunk:
-        # Decode each chunk from bytes to string
-        text = chunk.decode("utf-8")
-        # Append the chunk to the response text
-        response_text += text
-        # Update the Streamlit placeholder in real-time
-        placeholder.write(response_text)
-        time.sleep(0.1) # Small delay for smoother streaming effect
\ No newline at end of file
+# --- Send the request and stream the response (Server-Sent Events, see sse_client.py) ---
+if user_input:
+    response_text  = ""
+    for event, data in stream_chat(base_url, st.session_state['access_token'], user_input, st.session_state.session_id):
+        if event == "token":
+            # Append the chunk to the response text
+            response_text += data["content"]
+            # Update the Streamlit placeholder in real-time
+            placeholder.write(response_text)
+        elif event == "tool_start":
+            status.caption(f"Running {data['name']}...")
+        elif event == "tool_end":
+            status.caption(f"{data['name']} finished in {data['duration_ms'] / 1000:.1f}s")
+        elif event == "final":
+            status.caption(f"First token after {(data['ttft_ms'] or 0) / 1000:.1f}s, done in {data['duration_ms'] / 1000:.1f}s, {data['usage']['total_tokens']} tokens")
+        elif event == "error":
+            st.error(data["message"])
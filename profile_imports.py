@@ -0,0 +1,138 @@
+"""Measure the import-time cost of the app's entry points.
+
+Each entry point is imported in a fresh interpreter (run with -X importtime). The report
+shows, for every module the entry point imports directly, the CPU time and resident memory
+the import added (including everything it pulled in), followed by the slowest packages
+according to -X importtime.
+
+    python profile_imports.py                     # api, graph, mcp_custom.mcp_server
+    python profile_imports.py graph --top 20
+
+Entry points are imported for real, so module-level side effects run too (api.py and
+auth.py connect to DATABASE_URL, mcp_server opens the RAG index). An import that fails
+is reported with its error, after the modules it imported before failing.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ENTRY_POINTS = ["api", "graph", "mcp_custom.mcp_server"]
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child interpreter: times every import made directly by the entry point module
+CHILD = r'''
+import sys, os, time, json, builtins, importlib
+
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+        except ImportError:
+            return 0
+
+records, depth = [], [0]
+original_import = builtins.__import__
+
+def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if depth[0] or level or name in sys.modules:
+        depth[0] += 1
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            depth[0] -= 1
+    cpu, mem = time.process_time(), rss()
+    depth[0] += 1
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        depth[0] -= 1
+        records.append({"module": name, "cpu": time.process_time() - cpu, "rss": rss() - mem})
+
+sys.path.insert(0, os.getcwd())
+entry = sys.argv[1]
+start_cpu, start_rss = time.process_time(), rss()
+builtins.__import__ = timed_import
+error = None
+try:
+    importlib.import_module(entry)
+except BaseException as e:
+    error = f"{type(e).__name__}: {e}"
+finally:
+    builtins.__import__ = original_import
+print("\n" + json.dumps({
+    "cpu": time.process_time() - start_cpu,
+    "rss": rss() - start_rss,
+    "peak_rss": rss(),
+    "imports": records,
+    "error": error,
+}))
+'''
+
+
+def parse_importtime(stderr, entry, top):
+    """Top `top` packages by cumulative import time from -X importtime output (in seconds).
+    A package's cost is that of its most expensive import line (the one that loaded it first)."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.partition(":")[2].split("|")
+        package = name.strip().split(".")[0]
+        if package == entry.split(".")[0]:
+            continue
+        packages[package] = max(packages.get(package, 0.0), int(cumulative_us) / 1e6)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def profile(entry, top=15):
+    """Import `entry` in a child interpreter, returns the child's measurements."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, entry],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    try:
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        result = {"cpu": 0.0, "rss": 0, "peak_rss": 0, "imports": [],
+                  "error": f"child exited with {completed.returncode}: {completed.stderr.strip()[-500:]}"}
+    result["importtime"] = parse_importtime(completed.stderr, entry, top)
+    return result
+
+
+def report(entry, result, top=15):
+    mb = 1024 * 1024
+    print(f"\n=== {entry}: {result['cpu']:.2f}s CPU, +{result['rss'] / mb:.0f} MB RSS (peak {result['peak_rss'] / mb:.0f} MB)")
+    if result["error"]:
+        print(f"    import failed: {result['error']}")
+    print(f"    {'direct import':<45} {'CPU s':>8} {'RSS MB':>8}")
+    for record in sorted(result["imports"], key=lambda r: r["cpu"], reverse=True)[:top]:
+        print(f"    {record['module']:<45} {record['cpu']:>8.3f} {record['rss'] / mb:>8.1f}")
+    print(f"    {'slowest packages (-X importtime)':<45} {'wall s':>8}")
+    for name, seconds in result["importtime"]:
+        print(f"    {name:<45} {seconds:>8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import-time CPU and memory cost per entry point.")
+    parser.add_argument("entries", nargs="*", default=ENTRY_POINTS, help="modules to import (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {entry: profile(entry, args.top) for entry in args.entries}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for entry, result in results.items():
+        report(entry, result, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Server-Sent Events stream of an agent run, used by /chat/stream in SSE mode.
+
+Events (each `data` is a JSON object):
+
+- `token`: `{"content"}`, a chunk of the agent's answer (the whole answer at once if the model didn't stream)
+- `tool_start`: `{"name", "run_id", "input"}`
+- `tool_end`: `{"name", "run_id", "status", "duration_ms", "output"}` (output truncated). Every `tool_start`
+  gets one: `status` is "ok", "error" (the tool raised, `output` is the error) or "cancelled" (stopped
+  by the agent's per-tool timeout, or the run ended before the tool finished)
+- `final`: `{"session_id", "content", "usage", "ttft_ms", "duration_ms"}`, `content` is the text of the
+  agent's last model call
+- `error`: `{"message"}`
+
+A `: ping` comment is sent after `heartbeat` seconds without events, so proxies don't
+close the connection while a slow tool runs. sse_client.py parses this stream.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import contextlib
+
+logger = logging.getLogger("file_api_logger")
+
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))  # seconds
+TOOL_OUTPUT_CHARS = int(os.getenv("SSE_TOOL_OUTPUT_CHARS", "500"))
+
+_DONE = object()
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _text(content):
+    """Text of a message content, which is a string or a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(block if isinstance(block, str) else block.get("text", "") for block in content or [])
+
+
+def _tool_end(tool_starts, run_id, status, output):
+    name, start = tool_starts.pop(run_id)
+    return format_sse("tool_end", {
+        "name": name,
+        "run_id": run_id,
+        "status": status,
+        "duration_ms": _ms(time.monotonic() - start),
+        "output": output[:TOOL_OUTPUT_CHARS],
+    })
+
+
+def _cancel_tools(tool_starts):
+    """tool_end events for the tools that never reported an end (a cancelled tool sends no callback)."""
+    return [_tool_end(tool_starts, run_id, "cancelled", "") for run_id in list(tool_starts)]
+
+
+async def agent_events(graph, inputs, config, session_id, heartbeat=SSE_HEARTBEAT):
+    """Run `graph` with astream_events and yield SSE messages (strings)."""
+    queue = asyncio.Queue(maxsize=100)
+
+    async def pump():
+        # runs the graph in its own task, so the heartbeat doesn't have to interrupt it
+        try:
+            async for event in graph.astream_events(inputs, config):
+                await queue.put(event)
+            await queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    started = time.monotonic()
+    first_token = None
+    answer = []  # tokens streamed by the current LLM call
+    content = None  # text of the last finished LLM call
+    usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    tool_starts = {}  # run_id -> (name, start time) of the tools still running
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                logger.error(f"Error during streaming chat: {item}", extra={"api_path": "chat_stream"})
+                for message in _cancel_tools(tool_starts):
+                    yield message
+                yield format_sse("error", {"message": str(item)})
+                return
+
+            kind = item["event"]
+            # the agent's answer only, not the history summary (trim node)
+            from_llm = item["metadata"].get("langgraph_node") == "llm"
+            if kind == "on_chat_model_start" and from_llm:
+                answer = []  # a new LLM call of the turn, e.g. after tool results
+            elif kind == "on_chat_model_stream" and from_llm:
+                chunk = _text(item["data"]["chunk"].content)
+                if chunk:
+                    if first_token is None:
+                        first_token = time.monotonic()
+                    answer.append(chunk)
+                    yield format_sse("token", {"content": chunk})
+            elif kind == "on_chat_model_end":
+                output = item["data"].get("output")
+                # every model call of the run counts toward usage, including summaries
+                for key, value in (getattr(output, "usage_metadata", None) or {}).items():
+                    if key in usage:
+                        usage[key] += value
+                if from_llm:
+                    content = _text(getattr(output, "content", None)) or "".join(answer)
+                    if content and not answer:
+                        # nothing was streamed (non-streaming model or a cached response), send it whole
+                        if first_token is None:
+                            first_token = time.monotonic()
+                        yield format_sse("token", {"content": content})
+            elif kind == "on_tool_start":
+                tool_starts[item["run_id"]] = (item["name"], time.monotonic())
+                yield format_sse("tool_start", {"name": item["name"], "run_id": item["run_id"], "input": item["data"].get("input")})
+            elif kind == "on_tool_end" and item["run_id"] in tool_starts:
+                output = item["data"].get("output")
+                yield _tool_end(tool_starts, item["run_id"], "ok", str(getattr(output, "content", output)))
+            elif kind == "on_tool_error" and item["run_id"] in tool_starts:
+                yield _tool_end(tool_starts, item["run_id"], "error", str(item["data"].get("error")))
+            elif kind == "on_chain_end" and item["name"] == "action":
+                # the tool step is over: a tool still running was cancelled by its timeout
+                for message in _cancel_tools(tool_starts):
+                    yield message
+
+        for message in _cancel_tools(tool_starts):
+            yield message
+        ttft = _ms(first_token - started) if first_token is not None else None
+        duration = _ms(time.monotonic() - started)
+        logger.info(f"Session {session_id} | ttft_ms={ttft} | duration_ms={duration} | usage={usage}", extra={"api_path": "chat_stream"})
+        yield format_sse("final", {
+            "session_id": session_id,
+            "content": content if content is not None else "".join(answer),
+            "usage": usage,
+            "ttft_ms": ttft,
+            "duration_ms": duration,
+        })
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
@@ -0,0 +1,51 @@
+"""Small client for the SSE mode of /chat/stream (see sse.py for the event types).
+
+    for event, data in stream_chat("http://localhost:8000", token, "price of bitcoin?"):
+        if event == "token":
+            print(data["content"], end="", flush=True)
+"""
+import json
+
+import requests
+
+
+def iter_sse(lines):
+    """Parse SSE lines into (event, data) pairs; comments (heartbeats) are skipped."""
+    event, data = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            # a blank line ends the event
+            if data:
+                payload = "\n".join(data)
+                try:
+                    payload = json.loads(payload)
+                except json.JSONDecodeError:
+                    pass
+                yield event, payload
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip())
+
+
+def stream_chat(base_url, access_token, query, session_id=None, timeout=(5, 120)):
+    """POST to /chat/stream in SSE mode and yield (event, data) pairs as they arrive.
+    The read timeout only has to cover the gap between heartbeats."""
+    response = requests.post(
+        f"{base_url.rstrip('/')}/chat/stream",
+        params={"format": "sse"},
+        json={"query": query, "session_id": session_id},
+        headers={"Authorization": f"Bearer {access_token}", "Accept": "text/event-stream"},
+        stream=True,
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    with response:
+        yield from iter_sse(response.iter_lines(decode_unicode=True))
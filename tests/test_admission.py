@@ -0,0 +1,68 @@
+"""AdmissionController: FIFO handoff of freed slots, per-user limits, and 429s when the queue is full."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import api
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_freed_slot_goes_to_the_oldest_waiter_and_full_queue_is_rejected():
+    async def run():
+        admission = AdmissionController(max_inflight=1, per_user=5, max_queue=2, queue_timeout=5)
+        first = await admission.acquire("alice")
+        second = asyncio.create_task(admission.acquire("bob"))
+        third = asyncio.create_task(admission.acquire("carol"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("dave")
+        queued = admission.stats()
+
+        first.release()
+        first.release()  # idempotent
+        ticket = await second
+        assert not third.done()  # the slot went to bob only
+        assert admission.stats()["inflight"] == 1
+        ticket.release()
+        (await third).release()
+        return rejected.value, queued, admission.stats()
+
+    rejected, queued, final = asyncio.run(run())
+    assert rejected.reason == "queue full" and rejected.retry_after >= 1
+    assert queued["inflight"] == 1 and queued["queued"] == 2
+    assert final == {**final, "inflight": 0, "queued": 0, "admitted": 3, "rejected": 1}
+
+
+def test_per_user_limit_and_queue_timeout():
+    async def run():
+        admission = AdmissionController(max_inflight=1, per_user=1, max_queue=4, queue_timeout=0.05)
+        ticket = await admission.acquire("alice")
+        with pytest.raises(AdmissionRejected) as per_user:
+            await admission.acquire("alice")
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await admission.acquire("bob")
+        ticket.release()
+        (await admission.acquire("bob")).release()
+        return per_user.value, timed_out.value, admission.stats()
+
+    per_user, timed_out, stats = asyncio.run(run())
+    assert "alice" in per_user.reason
+    assert timed_out.reason.startswith("no slot within")
+    assert stats["timed_out"] == 1 and stats["inflight"] == 0 and stats["queued"] == 0
+
+
+def test_chat_admission_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(api, "admission", AdmissionController(max_inflight=1, per_user=5, max_queue=0))
+
+    async def run():
+        ticket = await api.admit("alice")
+        with pytest.raises(HTTPException) as rejected:
+            await api.admit("bob")
+        ticket.release()
+        (await api.admit("bob")).release()
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
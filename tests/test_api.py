@@ -0,0 +1,193 @@
+"""FastAPI app lifecycle: it serves right away and gates chat on its dependencies, connected in the background."""
+import asyncio
+import contextlib
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from langgraph.checkpoint.memory import InMemorySaver
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_connected_server_and_client_session
+
+import api
+from auth import User, get_current_active_user
+
+tools_server = FastMCP("TestTools")
+
+
+@tools_server.tool()
+def echo(text: str) -> str:
+    """Returns its input."""
+    return text
+
+
+class StubMCP:
+    """Stands in for the MCP server: refuses connections while down, else serves `tools_server` in memory."""
+
+    def __init__(self):
+        self.up = False
+        self.sessions = []
+
+    async def open_session(self, stack):
+        if not self.up:
+            raise ConnectionError("MCP server is down")
+        session = await stack.enter_async_context(create_connected_server_and_client_session(tools_server._mcp_server))
+        self.sessions.append(session)
+        return session
+
+    def go_down(self):
+        async def no_answer():
+            raise ConnectionError("MCP server is down")
+
+        self.up = False
+        self.sessions[-1].send_ping = no_answer
+
+
+class StubPostgres:
+    """Stands in for the checkpointer's Postgres: an in-memory saver while up, connection errors while down."""
+
+    def __init__(self):
+        self.up = True
+        self.opened = 0
+
+    async def open_checkpointer(self, stack):
+        if not self.up:
+            raise ConnectionError("postgres is down")
+        self.opened += 1
+        return InMemorySaver()
+
+    async def ping(self, saver):
+        if not self.up:
+            raise ConnectionError("postgres is down")
+
+
+@pytest.fixture
+def postgres():
+    return StubPostgres()
+
+
+@pytest.fixture
+def mcp(monkeypatch, postgres):
+    stub = StubMCP()
+
+    async def init_users_db():
+        pass
+
+    monkeypatch.setattr(api, "open_mcp_session", stub.open_session)
+    monkeypatch.setattr(api, "open_checkpointer", postgres.open_checkpointer)
+    monkeypatch.setattr(api, "ping_checkpointer", postgres.ping)
+    monkeypatch.setattr(api, "init_users_db", init_users_db)
+    monkeypatch.setattr(api, "DEPENDENCY_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(api, "DEPENDENCY_RETRY_MAX_DELAY", 0.05)
+    monkeypatch.setattr(api, "HEALTH_CHECK_INTERVAL", 0.05)
+    monkeypatch.setattr(api, "dependencies", dict(api.dependencies))
+    monkeypatch.setattr(api, "CHECKPOINT_RETENTION_INTERVAL", 0)
+    api.app.dependency_overrides[get_current_active_user] = lambda: User(username="tester", role="user")
+    yield stub
+    api.app.dependency_overrides.clear()
+
+
+def wait_for_readyz(client, code, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/readyz")
+        if response.status_code == code or time.monotonic() > deadline:
+            return response
+        time.sleep(0.02)
+
+
+def assert_chat_unavailable(client):
+    for path in ("/chat", "/chat/stream"):
+        response = client.post(path, json={"query": "hi"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+
+def test_app_starts_with_mcp_down_and_becomes_ready_when_it_comes_up(mcp):
+    with TestClient(api.app) as client:
+        assert client.get("/healthz").status_code == 200
+
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        time.sleep(0.1)  # a few failed connection attempts
+        dependencies = client.get("/readyz").json()["dependencies"]
+        assert dependencies["postgres"] == "ok"
+        assert dependencies["mcp"].startswith("unavailable")
+        assert_chat_unavailable(client)
+
+        mcp.up = True
+        response = wait_for_readyz(client, 200)
+        assert response.status_code == 200
+        assert response.json()["dependencies"]["agents"] == "ok"
+
+
+def test_app_goes_unready_when_mcp_stops_answering_and_reconnects(mcp):
+    mcp.up = True
+    with TestClient(api.app) as client:
+        assert wait_for_readyz(client, 200).status_code == 200
+
+        mcp.go_down()
+        response = wait_for_readyz(client, 503)
+        assert response.status_code == 503
+        assert response.json()["dependencies"]["mcp"].startswith("unavailable")
+        assert_chat_unavailable(client)
+
+        mcp.up = True
+        assert wait_for_readyz(client, 200).status_code == 200
+        assert len(mcp.sessions) == 2
+
+
+def test_app_goes_unready_when_postgres_stops_answering_and_reconnects(mcp, postgres):
+    mcp.up = True
+    with TestClient(api.app) as client:
+        assert wait_for_readyz(client, 200).status_code == 200
+
+        postgres.up = False
+        response = wait_for_readyz(client, 503)
+        assert response.status_code == 503
+        assert response.json()["dependencies"]["postgres"].startswith("unavailable")
+        assert_chat_unavailable(client)
+
+        postgres.up = True
+        assert wait_for_readyz(client, 200).status_code == 200
+        # a new checkpointer connection, and the agents rebuilt on it
+        assert postgres.opened == 2
+        assert len(mcp.sessions) == 2
+
+
+def test_failed_checkpointer_setup_closes_its_connection(monkeypatch):
+    connections = []
+
+    class Saver:
+        setups = 0
+
+        async def setup(self):
+            Saver.setups += 1
+            if Saver.setups < 3:
+                raise ConnectionError("setup failed")
+
+    class FakeAsyncPostgresSaver:
+        @staticmethod
+        @contextlib.asynccontextmanager
+        async def from_conn_string(conn_string):
+            connections.append("open")
+            try:
+                yield Saver()
+            finally:
+                connections[connections.index("open")] = "closed"
+
+    monkeypatch.setattr(api, "AsyncPostgresSaver", FakeAsyncPostgresSaver)
+    monkeypatch.setattr(api, "DEPENDENCY_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(api, "dependencies", dict(api.dependencies))
+
+    async def run():
+        async with contextlib.AsyncExitStack() as stack:
+            saver = await api.retry_forever("postgres", lambda: api.open_checkpointer(stack))
+            opened = list(connections)
+        return saver, opened
+
+    saver, opened = asyncio.run(run())
+    assert isinstance(saver, Saver)
+    # the two failed attempts were closed right away, the third stayed open until the stack closed
+    assert opened == ["closed", "closed", "open"]
+    assert connections == ["closed"] * 3
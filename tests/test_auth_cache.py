@@ -0,0 +1,63 @@
+"""Auth caches: a verified token is decoded once, and update_user drops the cached user."""
+from datetime import timedelta
+
+import jwt
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import auth
+from tools.cache import TTLCache
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    monkeypatch.setattr(auth, "user_cache", TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(auth, "token_cache", TTLCache(maxsize=100, ttl=60))
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    auth.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(auth.UserDB(username="alice", email="alice@test.com", hashed_password="x", role="user"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_token_is_decoded_once_and_invalid_tokens_are_not_cached(caches, monkeypatch):
+    decoded = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decoded.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    token = auth.create_access_token({"sub": "alice"})
+
+    assert auth.decode_token(token)["sub"] == "alice"
+    assert auth.decode_token(token)["sub"] == "alice"
+    assert len(decoded) == 1
+
+    expired = auth.create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=-1))
+    for _ in range(2):
+        with pytest.raises(jwt.InvalidTokenError):
+            auth.decode_token(expired)
+    assert len(decoded) == 3
+
+
+def test_update_user_invalidates_the_cached_user(caches, db):
+    assert auth.get_user_cached(db, "alice").role == "user"
+    db.query(auth.UserDB).filter(auth.UserDB.username == "alice").update({"role": "admin"})
+    db.commit()
+    assert auth.get_user_cached(db, "alice").role == "user"  # changed behind the cache's back
+
+    auth.update_user(db, "alice", disabled=True)
+
+    user = auth.get_user_cached(db, "alice")
+    assert user.disabled and user.role == "admin"
+    assert auth.get_user_cached(db, "nobody") is None
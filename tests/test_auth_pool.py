@@ -0,0 +1,69 @@
+"""bcrypt runs in a bounded pool: past PASSWORD_HASH_MAX_PENDING running or queued calls, requests get a 503."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+
+
+@pytest.fixture
+def slow_bcrypt(monkeypatch):
+    """Two slots, one worker, and a password check that blocks until released."""
+    release = threading.Event()
+    calls = []
+
+    def verify_password(plain_password, hashed_password):
+        calls.append(plain_password)
+        release.wait(5)
+        return plain_password == hashed_password
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(auth, "verify_password", verify_password)
+    monkeypatch.setattr(auth, "_hash_executor", executor)
+    monkeypatch.setattr(auth, "_hash_slots", threading.BoundedSemaphore(2))
+    yield release, calls
+    release.set()
+    executor.shutdown()
+
+
+def test_full_pool_answers_503_and_frees_slots_when_hashes_finish(slow_bcrypt):
+    release, calls = slow_bcrypt
+
+    async def run():
+        running = [asyncio.create_task(auth.averify_password(f"pw{i}", f"pw{i}")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as rejected:
+            await auth.averify_password("pw2", "pw2")
+        release.set()
+        results = await asyncio.gather(*running)
+        # both slots are back
+        return rejected.value, results, await asyncio.gather(*(auth.averify_password(f"pw{i}", "x") for i in range(2)))
+
+    rejected, results, later = asyncio.run(run())
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "1"
+    assert results == [True, True] and later == [False, False]
+    assert "pw2" not in calls  # rejected before reaching the pool
+
+
+def test_cancelled_requests_free_their_slot_once_bcrypt_is_done(slow_bcrypt):
+    release, calls = slow_bcrypt
+
+    async def run():
+        tasks = [asyncio.create_task(auth.averify_password(f"pw{i}", f"pw{i}")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # the queued call was dropped and freed its slot, the running one holds its slot until bcrypt returns
+        admitted = asyncio.create_task(auth.averify_password("pw2", "pw2"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException):
+            await auth.averify_password("pw3", "pw3")
+        release.set()
+        return await admitted
+
+    assert asyncio.run(run()) is True
+    assert calls == ["pw0", "pw2"]
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from tools.cache import SingleFlightCache
+
+
+def test_aget_coalesces_concurrent_misses():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        cache = SingleFlightCache(ttl=30)
+        results = await asyncio.gather(*(cache.aget("key", fetch) for _ in range(5)))
+        return cache, results
+
+    cache, results = asyncio.run(run())
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_aget_serves_stale_value_while_refreshing_in_background():
+    values = iter(["old", "new"])
+
+    async def fetch():
+        await asyncio.sleep(0.2)
+        return next(values)
+
+    async def run():
+        cache = SingleFlightCache(ttl=0.15, stale_ttl=10, stale_wait=0.01)
+        assert await cache.aget("key", fetch) == "old"
+        await asyncio.sleep(0.16)
+        start = time.monotonic()
+        stale = await cache.aget("key", fetch)
+        waited = time.monotonic() - start
+        await asyncio.sleep(0.25)  # background refresh finishes
+        return stale, waited, await cache.aget("key", fetch), cache
+
+    stale, waited, refreshed, cache = asyncio.run(run())
+    assert stale == "old" and waited < 0.1
+    assert refreshed == "new"
+    assert cache.stats()["stale_served"] == 1
+
+
+def test_aget_does_not_cache_failures():
+    attempts = []
+
+    async def fetch():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("upstream down")
+        return "value"
+
+    async def run():
+        cache = SingleFlightCache(ttl=30)
+        with pytest.raises(ConnectionError):
+            await cache.aget("key", fetch)
+        return await cache.aget("key", fetch)
+
+    assert asyncio.run(run()) == "value"
+    assert len(attempts) == 2
+
+
+def test_aget_fetch_survives_a_cancelled_caller():
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        cache = SingleFlightCache(ttl=30)
+        first = asyncio.create_task(cache.aget("key", fetch))
+        second = asyncio.create_task(cache.aget("key", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "value"
@@ -0,0 +1,117 @@
+"""CoinMarketCapClient against a local stub of the quotes endpoint."""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from tools.coinmarketcap import CoinMarketCapClient, PriceNotFound, QUOTES_PATH
+
+PRICES = {"bitcoin": 118205.23, "ethereum": 3750.5, "solana": 180.25}
+
+
+class StubQuotes(BaseHTTPRequestHandler):
+    """Answers like the real endpoint: without skip_invalid, one unknown slug fails the whole call."""
+
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        slugs = params["slug"].split(",")
+        self.requests.append(slugs)
+        valid = [slug for slug in slugs if slug in PRICES]
+        if url.path != QUOTES_PATH or not valid or (len(valid) < len(slugs) and params.get("skip_invalid") != "true"):
+            invalid = ",".join(slug for slug in slugs if slug not in PRICES)
+            return self._send(400, {"status": {"error_code": 400, "error_message": f'Invalid value for "slug": "{invalid}"'}})
+        data = {str(i): {"id": i, "slug": slug, "quote": {"USD": {"price": PRICES[slug]}}} for i, slug in enumerate(valid)}
+        self._send(200, {"status": {"error_code": 0}, "data": data})
+
+    def _send(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def client():
+    StubQuotes.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubQuotes)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cmc = CoinMarketCapClient("test-key", base_url=f"http://127.0.0.1:{server.server_port}", batch_window=0.05)
+    yield cmc
+    cmc.close()
+    server.shutdown()
+
+
+async def _prices(cmc, slugs):
+    return await asyncio.gather(*(cmc.aprice(slug) for slug in slugs), return_exceptions=True)
+
+
+def test_concurrent_callers_share_one_upstream_request(client):
+    results = asyncio.run(_prices(client, ["bitcoin", "ethereum", "bitcoin", "solana"]))
+
+    assert results == [PRICES["bitcoin"], PRICES["ethereum"], PRICES["bitcoin"], PRICES["solana"]]
+    assert len(StubQuotes.requests) == 1
+    assert sorted(StubQuotes.requests[0]) == ["bitcoin", "ethereum", "solana"]
+
+
+def test_unknown_slug_only_fails_its_own_callers(client):
+    results = asyncio.run(_prices(client, ["bitcoin", "nosuchcoin", "ethereum"]))
+
+    assert results[0] == PRICES["bitcoin"] and results[2] == PRICES["ethereum"]
+    assert isinstance(results[1], PriceNotFound)
+    assert len(StubQuotes.requests) == 1
+
+
+def test_batch_of_only_unknown_slugs_is_not_found(client):
+    results = asyncio.run(_prices(client, ["nosuchcoin", "othercoin"]))
+
+    assert all(isinstance(result, PriceNotFound) for result in results)
+
+
+def test_blocking_callers_are_batched_too(client):
+    results = [None] * 3
+
+    def call(i, slug):
+        results[i] = client.price(slug)
+
+    threads = [threading.Thread(target=call, args=(i, slug)) for i, slug in enumerate(["bitcoin", "ethereum", "solana"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [PRICES["bitcoin"], PRICES["ethereum"], PRICES["solana"]]
+    assert len(StubQuotes.requests) == 1
+
+
+def test_concurrent_get_price_calls_over_mcp_share_one_request(client, monkeypatch):
+    pytest.importorskip("langchain.chains")
+    pytest.importorskip("langchain_tool_to_mcp_adapter")
+    from langchain_mcp_adapters.tools import load_mcp_tools
+    from mcp.shared.memory import create_connected_server_and_client_session
+    from mcp_custom import mcp_server
+    from tools import tools
+
+    monkeypatch.setattr(tools, "cmc_client", client)
+    tools.price_cache.clear()
+
+    async def run():
+        async with create_connected_server_and_client_session(mcp_server.mcp._mcp_server) as session:
+            get_price = {tool.name: tool for tool in await load_mcp_tools(session)}["get_price"]
+            results = await asyncio.gather(*(get_price.ainvoke({"slug": slug}) for slug in ["Bitcoin", "ethereum", "nosuchcoin"]))
+            return ["".join(block["text"] for block in result) if isinstance(result, list) else result for result in results]
+
+    results = asyncio.run(run())
+
+    assert results == [f"price: {PRICES['bitcoin']} USD", f"price: {PRICES['ethereum']} USD", "No price found for nosuchcoin"]
+    assert len(StubQuotes.requests) == 1
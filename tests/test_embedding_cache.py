@@ -0,0 +1,92 @@
+"""CachedEmbeddings: one writer appending from several threads while other processes load the files."""
+import hashlib
+import multiprocessing
+import os
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from tools.embedding_cache import CachedEmbeddings
+
+TEXTS = [f"chunk {i}" for i in range(400)]
+
+
+def expected(text):
+    # exactly representable in float32, so cached and computed vectors compare equal
+    digest = hashlib.sha256(text.encode()).digest()
+    return [b / 16 for b in digest[:8]]
+
+
+class FakeEmbeddings(Embeddings):
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [expected(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return expected(text)
+
+
+def write(cache_dir):
+    """Four threads embedding overlapping batches through one cache."""
+    cache = CachedEmbeddings(FakeEmbeddings(), cache_dir=cache_dir, batch_size=7)
+
+    def worker(offset):
+        for start in range(offset, len(TEXTS), 20):
+            assert cache.embed_documents(TEXTS[start:start + 25]) == [expected(t) for t in TEXTS[start:start + 25]]
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in (0, 5, 10, 15)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_reader_processes_never_cut_rows_a_writer_is_appending(tmp_path):
+    cache_dir = str(tmp_path)
+    writer = multiprocessing.get_context("fork").Process(target=write, args=(cache_dir,))
+    writer.start()
+    readers = 0
+    while writer.is_alive() or readers == 0:
+        # a reader loading mid-append answers from the rows it mapped, the rest goes to the model
+        reader = CachedEmbeddings(FakeEmbeddings(), cache_dir=cache_dir)
+        assert [reader.embed_query(t) for t in TEXTS[::37]] == [expected(t) for t in TEXTS[::37]]
+        readers += 1
+    writer.join()
+    assert writer.exitcode == 0
+
+    files = os.path.join(cache_dir, "fake-embedding")
+    with open(os.path.join(files, "index.txt")) as f:
+        keys = f.read().split()
+    assert len(keys) == len(set(keys)) == len(TEXTS)
+    assert os.path.getsize(os.path.join(files, "vectors.f32")) == len(TEXTS) * 8 * 4
+
+    model = FakeEmbeddings()
+    final = CachedEmbeddings(model, cache_dir=cache_dir)
+    assert final.embed_documents(TEXTS) == [expected(t) for t in TEXTS]
+    assert model.calls == 0
+
+
+def test_writer_truncates_an_interrupted_append_before_writing(tmp_path):
+    cache = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    cache.embed_documents(TEXTS[:3])
+    vectors_path = os.path.join(cache.cache_dir, "vectors.f32")
+    with open(vectors_path, "ab") as f:
+        f.write(b"\0" * 20)  # a crashed append: a row and a half without keys
+
+    reader = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    assert reader.stats()["entries"] == 3
+    assert os.path.getsize(vectors_path) == 3 * 32 + 20  # readers leave the files alone
+
+    writer = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    assert writer.embed_documents(TEXTS[:5]) == [expected(t) for t in TEXTS[:5]]
+    assert os.path.getsize(vectors_path) == 5 * 32
+
+    model = FakeEmbeddings()
+    assert CachedEmbeddings(model, cache_dir=str(tmp_path)).embed_documents(TEXTS[:5]) == [expected(t) for t in TEXTS[:5]]
+    assert model.calls == 0
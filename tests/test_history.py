@@ -0,0 +1,48 @@
+"""HistoryTrimmer keeps the prompt of every turn under its token budget with a running summary."""
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from history import HistoryTrimmer, count_tokens
+
+
+def turn(i):
+    """One user turn: question, tool call, long tool output, answer."""
+    return [
+        HumanMessage(content=f"question {i}: what is the price of coin number {i}?"),
+        AIMessage(content="", tool_calls=[{"name": "get_price", "args": {"slug": f"coin{i}"}, "id": f"call-{i}"}]),
+        ToolMessage(content=" ".join(f"quote{i}-{j}" for j in range(400)), tool_call_id=f"call-{i}", name="get_price"),
+        AIMessage(content=f"coin number {i} trades at {i}.5 USD"),
+    ]
+
+
+def test_prompt_stays_under_budget_across_many_turns():
+    summaries = FakeListChatModel(responses=[f"summary {i}" for i in range(100)])
+    trimmer = HistoryTrimmer(summaries, max_tokens=600, keep_tokens=300, old_tool_tokens=20)
+    state = {"messages": []}
+
+    for i in range(15):
+        state["messages"] = state["messages"] + [turn(i)[0]]  # the trim node runs when the user message arrives
+        state.update(trimmer.trim(state))
+        window = trimmer.window(state)
+
+        assert count_tokens(window) <= trimmer.max_tokens
+        assert window[-1] is state["messages"][-1]  # the current question is never summarized away
+        if state.get("summary_upto"):
+            assert isinstance(state["messages"][state["summary_upto"]], HumanMessage)  # never between a tool call and its output
+            assert window[0].content.startswith("Summary of the earlier conversation:\nsummary")
+        state["messages"] = state["messages"] + turn(i)[1:]
+
+    assert state["summary_upto"] > 0
+    assert len(state["messages"]) == 60  # the checkpointed history itself is complete
+
+
+def test_old_tool_outputs_are_truncated_and_short_history_is_left_alone():
+    summaries = FakeListChatModel(responses=["unused"])
+    trimmer = HistoryTrimmer(summaries, max_tokens=10_000, keep_tokens=5_000, old_tool_tokens=20)
+    state = {"messages": turn(0) + turn(1)[:1]}
+
+    assert trimmer.trim(state) == {}
+    window = trimmer.window(state)
+    assert len(window) == 5
+    assert count_tokens(window[2:3]) < count_tokens(state["messages"][2:3]) / 10
+    assert "truncated" in window[2].content
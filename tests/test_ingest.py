@@ -0,0 +1,180 @@
+"""Ingestion CLI: unchanged documents are skipped, changed ones only re-embed new chunks, stale chunks are
+deleted from the local vector index and the BM25 index, both persisted incrementally, and retrieval
+picks up the new index."""
+import asyncio
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from tools import ingest, vectorstore
+from tools.bm25 import BM25Index, HybridRetriever, tokenize
+from tools.embedding_cache import CachedEmbeddings
+from tools.index_reload import ReloadingRetriever
+from tools.local_index import LocalVectorIndex
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag of hashed words, so texts sharing words are close."""
+
+    model = "hashing"
+
+    def __init__(self):
+        self.embedded = []
+
+    def _embed(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for token in tokenize(text):
+            vector[int(hashlib.sha256(token.encode()).hexdigest(), 16) % 64] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def text_pages(pdf_path, ocr_workers=None):
+    """Stands in for PDF parsing: the test "PDFs" are text files with one page per paragraph."""
+    with open(pdf_path) as f:
+        paragraphs = f.read().split("\n\n")
+    for i, text in enumerate(paragraphs):
+        yield Document(page_content=text, metadata={"source": ingest.source_name(pdf_path), "page": i, "page_number": i})
+
+
+def page_chunks(pages):
+    """One chunk per page (the text splitter's job is not under test here)."""
+    for page in pages:
+        page.metadata["chunk_id"] = ingest.chunk_id(page)
+        yield page
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    model = HashingEmbeddings()
+    monkeypatch.setattr(vectorstore, "embeddings", CachedEmbeddings(model, cache_dir=str(tmp_path / "embedding_cache")))
+    monkeypatch.setattr(vectorstore, "VECTOR_BACKEND", "local")
+    monkeypatch.setattr(vectorstore, "LOCAL_INDEX_DIR", str(tmp_path / "local_index"))
+    monkeypatch.setattr(vectorstore, "LOCAL_INDEX_KIND", "exact")
+    monkeypatch.setattr(vectorstore, "BM25_INDEX_PATH", str(tmp_path / "bm25_index.json"))
+    monkeypatch.setattr(ingest, "iter_pages", text_pages)
+    monkeypatch.setattr(ingest, "iter_chunks", page_chunks)
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.pdf").write_text("attention is all you need\n\nmulti head attention layers")
+    (docs / "b.pdf").write_text("positional encodings use sines\n\nthe decoder is masked")
+    (docs / "c.pdf").write_text("label smoothing hurts perplexity")
+    return model, docs, tmp_path
+
+
+def run(docs, tmp_path, **kwargs):
+    return ingest.ingest([str(docs)], manifest_path=str(tmp_path / "manifest.json"), checkpoint_every=1, **kwargs)
+
+
+def indexed_texts(tmp_path):
+    """Chunk texts of the vector index and the BM25 index, as a serving process loads them."""
+    index = LocalVectorIndex.load(HashingEmbeddings(), index_dir=str(tmp_path / "local_index"), kind="exact")
+    bm25 = BM25Index.load(str(tmp_path / "bm25_index.json"))
+    dense = sorted(doc.page_content for doc in index.similarity_search("attention", k=100))
+    lexical = sorted(doc["text"] for doc in bm25.docs.values())
+    assert dense == lexical
+    return dense
+
+
+def test_unchanged_documents_are_skipped(corpus):
+    model, docs, tmp_path = corpus
+    assert run(docs, tmp_path)["added"] == 5
+    assert len(model.embedded) == 5
+
+    stats = run(docs, tmp_path)
+
+    assert stats == {**stats, "added": 0, "deleted": 0}
+    assert len(model.embedded) == 5
+    assert len(indexed_texts(tmp_path)) == 5
+
+
+def test_changed_document_replaces_only_its_stale_chunks(corpus):
+    model, docs, tmp_path = corpus
+    run(docs, tmp_path)
+    (docs / "a.pdf").write_text("attention is all you need\n\nscaled dot product attention")
+
+    stats = run(docs, tmp_path)
+
+    assert (stats["added"], stats["deleted"]) == (1, 1)
+    assert model.embedded[5:] == ["scaled dot product attention"]
+    texts = indexed_texts(tmp_path)
+    assert "multi head attention layers" not in texts
+    assert "scaled dot product attention" in texts and len(texts) == 5
+
+
+def test_prune_deletes_chunks_of_removed_documents(corpus):
+    model, docs, tmp_path = corpus
+    run(docs, tmp_path)
+    os.remove(docs / "b.pdf")
+
+    assert run(docs, tmp_path)["deleted"] == 0  # without --prune the document is kept
+    stats = run(docs, tmp_path, prune=True)
+
+    assert stats["deleted"] == 2
+    assert indexed_texts(tmp_path) == sorted(["attention is all you need", "multi head attention layers", "label smoothing hurts perplexity"])
+
+
+def test_checkpoints_append_to_the_index_files(corpus):
+    model, docs, tmp_path = corpus
+    for i in range(20):
+        (docs / f"extra{i:02}.pdf").write_text(f"extra document number {i}")
+
+    run(docs, tmp_path)
+
+    # the first checkpoint writes a snapshot, the later ones append one line per change
+    with open(tmp_path / "bm25_index.json") as f:
+        assert len(f.read().splitlines()) > 20
+    local_index = tmp_path / "local_index"
+    assert sorted(os.listdir(local_index)) == ["CURRENT", "docs-1.jsonl", "vectors-1.f32"]
+    assert len(indexed_texts(tmp_path)) == 25
+
+
+def test_retrieval_follows_reingestion(corpus):
+    model, docs, tmp_path = corpus
+    manifest_path = str(tmp_path / "manifest.json")
+
+    def load():
+        index = vectorstore.get_vectorstore()
+        retriever = HybridRetriever(vector_retriever=index.as_retriever(search_kwargs={"k": 10}), bm25=BM25Index.load(vectorstore.BM25_INDEX_PATH), k=10)
+        return retriever, retriever
+
+    retriever = ReloadingRetriever(load=load, manifest_path=manifest_path)
+    run(docs, tmp_path)
+    assert "multi head attention layers" in [doc.page_content for doc in retriever.invoke("multi head attention")]
+
+    (docs / "a.pdf").write_text("attention is all you need\n\nscaled dot product attention")
+    run(docs, tmp_path)
+
+    for texts in ([doc.page_content for doc in retriever.invoke("multi head attention")],
+                  [doc.page_content for doc in asyncio.run(retriever.ainvoke("multi head attention"))]):
+        assert "multi head attention layers" not in texts
+        assert "scaled dot product attention" in texts
+
+
+def test_rag_tool_retriever_follows_reingestion(corpus, monkeypatch):
+    pytest.importorskip("langchain.chains")
+    from tools import rag_tool
+
+    model, docs, tmp_path = corpus
+    monkeypatch.setattr(rag_tool, "BM25_INDEX_PATH", vectorstore.BM25_INDEX_PATH)
+    monkeypatch.setattr(rag_tool, "RETRIEVAL_MODE", "hybrid")
+    retriever = rag_tool.ReloadingRetriever(load=rag_tool.open_retrievers, manifest_path=str(tmp_path / "manifest.json"))
+    run(docs, tmp_path)
+    assert "multi head attention layers" in [doc.page_content for doc in retriever.invoke("multi head attention")]
+
+    (docs / "a.pdf").write_text("attention is all you need\n\nscaled dot product attention")
+    run(docs, tmp_path)
+
+    texts = [doc.page_content for doc in retriever.invoke("multi head attention")]
+    assert "multi head attention layers" not in texts and "scaled dot product attention" in texts
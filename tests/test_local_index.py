@@ -0,0 +1,75 @@
+"""LocalVectorIndex search results (exact NumPy and FAISS IVF), upserts, deletes and persistence."""
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from tools.local_index import IVF_MIN_ROWS, LocalVectorIndex
+
+
+class TableEmbeddings(Embeddings):
+    """Embeds "doc <i>" as row i of a fixed random matrix."""
+
+    def __init__(self, n, dim=32, seed=0):
+        self.vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+    def _embed(self, text):
+        return self.vectors[int(text.split()[1])].tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def build(tmp_path, n, kind):
+    embeddings = TableEmbeddings(n)
+    index = LocalVectorIndex(embeddings, index_dir=str(tmp_path), kind=kind)
+    index.add_texts([f"doc {i}" for i in range(n)], metadatas=[{"i": i} for i in range(n)], ids=[f"id-{i}" for i in range(n)])
+    return index, embeddings
+
+
+def brute_force(embeddings, query_row, k):
+    vectors = embeddings.vectors / np.linalg.norm(embeddings.vectors, axis=1, keepdims=True)
+    scores = vectors @ vectors[query_row]
+    return [f"id-{row}" for row in np.argsort(-scores)[:k]]
+
+
+def test_exact_search_returns_the_true_nearest_neighbours(tmp_path):
+    index, embeddings = build(tmp_path, 300, "exact")
+
+    for row in (0, 17, 299):
+        results = index.similarity_search_with_score(f"doc {row}", k=5)
+        assert [doc.id for doc, _ in results] == brute_force(embeddings, row, 5)
+        assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+        assert results[0][0].metadata == {"i": row} and results[0][0].page_content == f"doc {row}"
+
+
+def test_ivf_search_finds_each_vector_and_agrees_with_exact_search(tmp_path):
+    n = 2 * IVF_MIN_ROWS
+    index, embeddings = build(tmp_path, n, "ivf")
+
+    recall = []
+    for row in range(0, n, 97):
+        ids = [doc.id for doc in index.similarity_search(f"doc {row}", k=5)]
+        assert ids[0] == f"id-{row}"  # a vector lands in the cell of its nearest centroid, which is probed
+        recall.append(len(set(ids) & set(brute_force(embeddings, row, 5))) / 5)
+    assert np.mean(recall) >= 0.6
+
+
+def test_small_ivf_index_falls_back_to_exact_results(tmp_path):
+    index, embeddings = build(tmp_path, 200, "ivf")
+
+    assert [doc.id for doc in index.similarity_search("doc 42", k=5)] == brute_force(embeddings, 42, 5)
+
+
+def test_upsert_delete_and_reload(tmp_path):
+    index, embeddings = build(tmp_path, 50, "exact")
+    index.add_texts(["doc 7"], metadatas=[{"i": "again"}], ids=["id-7"])  # same id: replaced, not duplicated
+    index.delete(["id-3"])
+    index.save()
+
+    reloaded = LocalVectorIndex.load(embeddings, index_dir=str(tmp_path), kind="exact")
+    ids = [doc.id for doc in reloaded.similarity_search("doc 3", k=50)]
+    assert len(ids) == 49 and "id-3" not in ids and ids.count("id-7") == 1
+    assert reloaded.similarity_search("doc 7", k=1)[0].metadata == {"i": "again"}
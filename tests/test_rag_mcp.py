@@ -0,0 +1,129 @@
+"""rag_qa through the MCP server: per-session chat memory and the answer cache."""
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+pytest.importorskip("langchain.chains")
+pytest.importorskip("langchain_tool_to_mcp_adapter")
+
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langgraph.checkpoint.memory import InMemorySaver
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from graph import Agent, takes_session
+from mcp_custom import mcp_server
+from tools import rag_tool
+from tools.qa_cache import QACache
+from tools.session_memory import SessionMemoryStore
+
+
+class WordCounter(GenericFakeChatModel):
+    """Stands in for the chat model the memory uses to count tokens."""
+
+    def get_num_tokens_from_messages(self, messages, tools=None):
+        return sum(len(str(m.content).split()) for m in messages)
+
+
+class FakeGenerator:
+    """Condense step: turns a follow-up into a standalone question."""
+
+    def _condense(self, inputs):
+        assert inputs["chat_history"]
+        return {"text": f"{inputs['question']} (in the Transformer)"}
+
+    def invoke(self, inputs):
+        return self._condense(inputs)
+
+    async def ainvoke(self, inputs):
+        return self._condense(inputs)
+
+
+class FakeChain:
+    """Records the questions that reach the RAG chain."""
+
+    get_chat_history = None
+
+    def __init__(self):
+        self.question_generator = FakeGenerator()
+        self.questions = []
+
+    def invoke(self, inputs):
+        assert inputs["chat_history"] == []
+        self.questions.append(inputs["question"])
+        return {"answer": f"answer to {inputs['question']}"}
+
+    async def ainvoke(self, inputs):
+        return self.invoke(inputs)
+
+
+class ToolCallingModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@pytest.fixture
+def rag(monkeypatch, tmp_path):
+    chain = FakeChain()
+    monkeypatch.setattr(rag_tool, "qa_chain", chain)
+    monkeypatch.setattr(rag_tool, "aqa_chain", chain)
+    monkeypatch.setattr(rag_tool, "qa_cache", QACache(manifest_path=str(tmp_path / "manifest.json")))
+    monkeypatch.setattr(rag_tool, "session_memories", SessionMemoryStore(llm=WordCounter(messages=iter([]))))
+    return chain
+
+
+def _text(result):
+    # MCP tools return a list of content blocks
+    if isinstance(result, list):
+        return "".join(block["text"] for block in result if block.get("type") == "text")
+    return str(result)
+
+
+async def _with_mcp_tools(run):
+    async with create_connected_server_and_client_session(mcp_server.mcp._mcp_server) as session:
+        tools = {tool.name: tool for tool in await load_mcp_tools(session)}
+        return await run(tools)
+
+
+def _history(session_id):
+    return rag_tool.session_memories.get(session_id).load_memory_variables({})["chat_history"]
+
+
+def test_sessions_and_answer_cache_over_mcp(rag):
+    async def run(tools):
+        rag_qa = tools["rag_qa"]
+        assert takes_session(rag_qa)
+
+        async def ask(query, session_id):
+            return _text(await rag_qa.ainvoke({"query": query, "session_id": session_id}))
+
+        first = await ask("What is attention?", "a")
+        # same question in another session: no history there, answered from the cache
+        assert await ask("what is attention", "b") == first
+        # follow-ups are condensed with each session's own history and cached under the result
+        follow_up = await ask("And multi-head?", "a")
+        assert await ask("And multi-head?", "b") == follow_up
+
+    asyncio.run(_with_mcp_tools(run))
+
+    assert rag.questions == ["What is attention?", "And multi-head? (in the Transformer)"]
+    assert len(_history("a")) == len(_history("b")) == 4
+
+
+def test_agent_passes_thread_id_to_rag_qa_over_mcp(rag):
+    async def run(tools):
+        for thread_id in ("thread-1", "thread-2"):
+            model = ToolCallingModel(messages=iter([
+                AIMessage(content="", tool_calls=[{"name": "rag_qa", "args": {"query": "What is attention?"}, "id": "call-1"}]),
+                AIMessage(content="done"),
+            ]))
+            agent = Agent(model, [tools["rag_qa"]])
+            agent.compile(InMemorySaver())
+            await agent.graph.ainvoke({"messages": [HumanMessage(content="hi")]}, {"configurable": {"thread_id": thread_id}})
+
+    asyncio.run(_with_mcp_tools(run))
+
+    assert [m.content for m in _history("thread-1")] == ["What is attention?", "answer to What is attention?"]
+    assert len(_history("thread-2")) == 2
+    assert not _history("default")
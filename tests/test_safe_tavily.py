@@ -0,0 +1,62 @@
+"""safe_tavily: coalescing of identical searches and upstream errors that must not be cached."""
+import asyncio
+
+import pytest
+import requests
+
+pytest.importorskip("langchain.chains")
+
+from tools import tools
+
+
+class FakeTavily:
+    """Behaves like TavilySearch: upstream errors come back as {"error": e}, not as exceptions."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.queries = []
+
+    def invoke(self, inputs):
+        self.queries.append(inputs["query"])
+        return self.responses.pop(0)
+
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(0.05)
+        return self.invoke(inputs)
+
+
+RESULTS = {"results": [{"title": "LA weather", "url": "https://example.com", "content": "Sunny, 75F"}]}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    tools.search_cache.clear()
+
+
+def test_identical_searches_in_flight_share_one_call(monkeypatch):
+    tavily = FakeTavily([RESULTS])
+    monkeypatch.setattr(tools, "tavily_tool", tavily)
+
+    async def run():
+        return await asyncio.gather(*(tools.safe_tavily.ainvoke({"query": q}) for q in ["LA weather", "la  weather?", "LA Weather"]))
+
+    results = asyncio.run(run())
+
+    assert results == ["LA weather (https://example.com): Sunny, 75F"] * 3
+    assert len(tavily.queries) == 1
+
+
+@pytest.mark.parametrize("call", ["sync", "async"])
+def test_upstream_error_is_returned_but_not_cached(monkeypatch, call):
+    tavily = FakeTavily([{"error": requests.exceptions.ConnectionError("connection reset")}, RESULTS])
+    monkeypatch.setattr(tools, "tavily_tool", tavily)
+
+    def search():
+        if call == "sync":
+            return tools.safe_tavily.invoke({"query": "LA weather"})
+        return asyncio.run(tools.safe_tavily.ainvoke({"query": "LA weather"}))
+
+    assert search() == "Tavily network error: connection reset"
+    assert search() == "LA weather (https://example.com): Sunny, 75F"
+    assert search() == "LA weather (https://example.com): Sunny, 75F"
+    assert len(tavily.queries) == 2
@@ -0,0 +1,120 @@
+"""Typed SSE stream of an agent run (sse.agent_events), parsed back with sse_client.iter_sse."""
+import asyncio
+import json
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from openai import AsyncOpenAI
+
+import graph
+from sse import agent_events
+from sse_client import iter_sse
+
+
+def openai_stub(request):
+    """Chat completions endpoint that streams "Hello world" and, only if asked to, the token usage."""
+    body = json.loads(request.content)
+    usage = {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14}
+    base = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": body["model"]}
+    chunks = [
+        {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": "Hello"}, "finish_reason": None}]},
+        {**base, "choices": [{"index": 0, "delta": {"content": " world"}, "finish_reason": None}]},
+        {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+    ]
+    if body.get("stream_options", {}).get("include_usage"):
+        chunks.append({**base, "choices": [], "usage": usage})
+    stream = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    return httpx.Response(200, text=stream, headers={"Content-Type": "text/event-stream"})
+
+
+class ScriptedModel(BaseChatModel):
+    """Non-streaming model answering with the given messages in order."""
+
+    responses: list
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self.responses.pop(0))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+
+@tool
+async def slow_tool(query: str) -> str:
+    """Takes longer than its timeout."""
+    await asyncio.sleep(5)
+    return "too late"
+
+
+@tool
+async def broken_tool(query: str) -> str:
+    """Always fails."""
+    raise ValueError("upstream exploded")
+
+
+@tool
+async def quick_tool(query: str) -> str:
+    """Answers right away."""
+    return f"quick answer to {query}"
+
+
+def run_events(agent, query="hi"):
+    async def collect():
+        config = {"configurable": {"thread_id": "sse-test"}}
+        return [message async for message in agent_events(agent.graph, {"messages": [HumanMessage(content=query)]}, config, "sse-test")]
+
+    return list(iter_sse("".join(asyncio.run(collect())).splitlines()))
+
+
+def test_streamed_answer_reports_tokens_content_and_usage():
+    # the agent model as configured in graph.py, talking to the stub endpoint
+    stub = AsyncOpenAI(api_key="sk-test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(openai_stub)))
+    assert graph.model.stream_usage  # the stub only reports usage when the request asks for it
+    model = graph.model.model_copy(update={"root_async_client": stub, "async_client": stub.chat.completions})
+    agent = graph.Agent(model, [])
+    agent.compile(InMemorySaver())
+
+    events = run_events(agent)
+
+    assert [data["content"] for event, data in events if event == "token"] == ["Hello", " world"]
+    event, final = events[-1]
+    assert event == "final"
+    assert final["content"] == "Hello world"
+    assert final["usage"] == {"input_tokens": 12, "output_tokens": 2, "total_tokens": 14}
+    assert final["ttft_ms"] is not None
+
+
+def test_every_tool_start_gets_a_terminal_tool_end_and_unstreamed_answer_is_sent():
+    model = ScriptedModel(responses=[
+        AIMessage(content="", tool_calls=[
+            {"name": "slow_tool", "args": {"query": "a"}, "id": "call-slow"},
+            {"name": "broken_tool", "args": {"query": "b"}, "id": "call-broken"},
+            {"name": "quick_tool", "args": {"query": "c"}, "id": "call-quick"},
+        ]),
+        AIMessage(content="All done"),
+    ])
+    agent = graph.Agent(model, [slow_tool, broken_tool, quick_tool], tool_timeouts={"slow_tool": 0.1})
+    agent.compile(InMemorySaver())
+
+    events = run_events(agent)
+
+    starts = {data["run_id"]: data["name"] for event, data in events if event == "tool_start"}
+    ends = {data["run_id"]: data for event, data in events if event == "tool_end"}
+    assert sorted(starts.values()) == ["broken_tool", "quick_tool", "slow_tool"]
+    assert ends.keys() == starts.keys()
+    status = {starts[run_id]: end["status"] for run_id, end in ends.items()}
+    assert status == {"slow_tool": "cancelled", "broken_tool": "error", "quick_tool": "ok"}
+    assert "upstream exploded" in next(end["output"] for end in ends.values() if end["name"] == "broken_tool")
+
+    # the model didn't stream: its answer comes as one token event and as the final content
+    assert [data["content"] for event, data in events if event == "token"] == ["All done"]
+    event, final = events[-1]
+    assert event == "final" and final["content"] == "All done"
@@ -0,0 +1,220 @@
+"""Lexical (BM25) retrieval for the RAG tool, fused with vector search.
+
+`BM25Index` is an inverted index over the chunks, maintained by the ingestion CLI next to
+the vector store and persisted as JSON lines: a snapshot of every chunk, then the chunks
+added and removed by each later save. `HybridRetriever` runs it together with the
+vector retriever and merges both rankings with reciprocal rank fusion (RRF). Exact terms
+(layer names, symbols, table values) are found by BM25 even when the embedding misses
+them, and a confident BM25 hit can answer without the query-embedding API call at all.
+"""
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger("file_api_logger")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Incrementally updatable BM25 (Okapi) index keyed by chunk id."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {chunk id: term frequency}
+        self.doc_len = {}  # chunk id -> number of tokens
+        self.docs = {}  # chunk id -> {"text", "metadata"}
+        self._total_len = 0
+        self._pending = []  # ("add", chunk id, doc) / ("remove", chunk id, None) since the last save
+        self._path = None  # file this process appends to, None until its first save
+        self._logged = 0  # changes appended to it after the snapshot
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, text, metadata=None):
+        self._remove(doc_id)  # adding an existing id replaces it
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.doc_len[doc_id] = length
+        self._total_len += length
+        self.docs[doc_id] = {"text": text, "metadata": metadata or {}}
+        self._pending.append(("add", doc_id, self.docs[doc_id]))
+
+    def add_documents(self, documents, ids):
+        for doc, doc_id in zip(documents, ids):
+            self.add(doc_id, doc.page_content, doc.metadata)
+
+    def remove(self, ids):
+        for doc_id in ids:
+            if self._remove(doc_id):
+                self._pending.append(("remove", doc_id, None))
+
+    def _remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        for term in set(tokenize(doc["text"])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self._total_len -= self.doc_len.pop(doc_id)
+        return True
+
+    def clear(self):
+        self.postings, self.doc_len, self.docs = {}, {}, {}
+        self._total_len = 0
+        self._pending = []
+        self._path = None  # the next save writes a new, empty snapshot
+
+    def search(self, query, k=5):
+        """Return [(Document, score)] of the k best matching chunks."""
+        n = len(self.docs)
+        if not n:
+            return []
+        avgdl = self._total_len / n
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.document(doc_id), score) for doc_id, score in best]
+
+    def document(self, doc_id):
+        doc = self.docs[doc_id]
+        return Document(page_content=doc["text"], metadata=doc["metadata"], id=doc_id)
+
+    # --- persistence ---
+    def save(self, path):
+        """Append the chunks added and removed since the last save; postings are rebuilt on load.
+
+        The first save of a process, and any save once the appended changes outnumber the chunks,
+        writes a new snapshot instead (temp file + rename), so the file stays O(index size).
+        """
+        if path != self._path or self._logged > len(self.docs):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps({"k1": self.k1, "b": self.b, "docs": self.docs}) + "\n")
+            os.replace(tmp_path, path)
+            self._path, self._logged, self._pending = path, 0, []
+            return
+        lines = []
+        for op, doc_id, doc in self._pending:
+            # one line per run of adds or removes, replayed in order
+            if not lines or op not in lines[-1]:
+                lines.append({op: {} if op == "add" else []})
+            if op == "add":
+                lines[-1]["add"][doc_id] = doc
+            else:
+                lines[-1]["remove"].append(doc_id)
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(line) + "\n" for line in lines))
+        self._logged += len(self._pending)
+        self._pending = []
+
+    @classmethod
+    def load(cls, path):
+        """Open the index at `path` (empty if it doesn't exist yet)."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as f:
+            lines = f.read().split("\n")
+        data = json.loads(lines[0])
+        index = cls(k1=data["k1"], b=data["b"])
+        for doc_id, doc in data["docs"].items():
+            index.add(doc_id, doc["text"], doc["metadata"])
+        for line in lines[1:]:
+            try:
+                change = json.loads(line)
+            except json.JSONDecodeError:
+                break  # the last line is empty or still being appended
+            for doc_id, doc in change.get("add", {}).items():
+                index.add(doc_id, doc["text"], doc["metadata"])
+            for doc_id in change.get("remove", []):
+                index._remove(doc_id)
+        index._pending = []
+        logger.info(f"BM25 index loaded: {len(index)} chunks from {path}", extra={"api_path": "bm25"})
+        return index
+
+
+def _doc_key(doc):
+    return doc.metadata.get("chunk_id") or doc.id or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings, k=5, rrf_k=60):
+    """Merge several ranked lists of Documents: score(d) = sum over lists of 1 / (rrf_k + rank)."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-retriever")
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + vector retrieval fused with RRF.
+
+    If `confident_score` is set, BM25 runs first and its results are returned alone when the
+    top hit scores at least `confident_score` and beats the runner-up by `confident_margin`;
+    otherwise both searches run in parallel.
+    """
+
+    vector_retriever: BaseRetriever
+    bm25: BM25Index
+    k: int = 5
+    fetch_k: int = 10  # candidates taken from each ranking before fusion
+    rrf_k: int = 60
+    confident_score: float = 0.0  # 0 disables the BM25-only shortcut
+    confident_margin: float = 1.5
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _is_confident(self, hits):
+        if not self.confident_score or not hits or hits[0][1] < self.confident_score:
+            return False
+        return len(hits) == 1 or hits[0][1] >= self.confident_margin * hits[1][1]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.confident_score:
+            lexical = self.bm25.search(query, self.fetch_k)
+            if self._is_confident(lexical):
+                return [doc for doc, _ in lexical[:self.k]]
+            dense = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        else:
+            future = _executor.submit(self.vector_retriever.invoke, query, {"callbacks": run_manager.get_child()})
+            lexical = self.bm25.search(query, self.fetch_k)
+            dense = future.result()
+        return reciprocal_rank_fusion([[doc for doc, _ in lexical], dense], k=self.k, rrf_k=self.rrf_k)
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        lexical = self.bm25.search(query, self.fetch_k)  # in-process, no I/O
+        if self._is_confident(lexical):
+            return [doc for doc, _ in lexical[:self.k]]
+        dense = await self.vector_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return reciprocal_rank_fusion([[doc for doc, _ in lexical], dense], k=self.k, rrf_k=self.rrf_k)
@@ -0,0 +1,226 @@
+"""Small caching building blocks shared by the tools.
+
+`TTLCache` is a thread-safe in-memory LRU with per-entry expiry and hit/miss counters.
+`SQLiteCache` is an optional persistent tier with the same get/set interface, storing
+JSON-serializable values with an expiry time.
+`SingleFlightCache` sits in front of an upstream call: concurrent misses for a key share
+one fetch, and stale entries are served while a refresh runs in the background. `get` is for
+sync callers (worker threads), `aget` for coroutines on an event loop.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize=1000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] <= time.monotonic():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    """Persistent key/value tier; values must be JSON-serializable."""
+
+    def __init__(self, path, ttl=3600, table="cache"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return default
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                               (key, json.dumps(value), expires_at))
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def purge_expired(self):
+        """Delete expired rows, returns how many were removed."""
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def trim(self, max_rows):
+        """Keep at most `max_rows` rows, dropping the ones closest to expiry first. Returns how many were removed."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (max_rows,),
+            ).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class SingleFlightCache:
+    """TTL cache with request coalescing and stale-while-revalidate.
+
+    Entries are fresh for `ttl` seconds and may be served stale for `stale_ttl` seconds more.
+    A caller that finds a stale entry starts a background refresh and waits at most
+    `stale_wait` seconds for it, then gets the stale value (also when the refresh fails).
+    Failed fetches are not cached.
+
+    `aget` does the same for async callers without blocking the event loop: concurrent misses
+    await one shared task and the refresh of a stale entry is a background task. Both share the
+    cached entries; every `aget` caller must run on the same event loop.
+    """
+
+    def __init__(self, maxsize=1000, ttl=30, stale_ttl=300, stale_wait=0.5, max_workers=4):
+        self.ttl = ttl
+        self.stale_wait = stale_wait
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> Future of the running fetch
+        self._tasks = {}  # key -> asyncio.Task of the running async fetch (only touched on the event loop)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-refresh")
+        self.coalesced = 0
+        self.stale_served = 0
+
+    def _join(self, key):
+        """Return (future, owner): the in-flight fetch of `key`, owner=True if the caller must run it."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _run(self, key, fetch, future):
+        try:
+            value = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            self._cache.set(key, (value, time.monotonic()))
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, key, fetch):
+        """Return the value of `key`, calling `fetch()` (once for all concurrent callers) when needed."""
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        future, owner = self._join(key)
+        if entry is None:
+            if owner:
+                self._run(key, fetch, future)  # nothing to serve meanwhile, fetch in the caller's thread
+            return future.result()
+        if owner:
+            self._executor.submit(self._run, key, fetch, future)
+        try:
+            return future.result(timeout=self.stale_wait)
+        except Exception:  # refresh still running or failed
+            self.stale_served += 1
+            return entry[0]
+
+    async def _arun(self, key, fetch):
+        try:
+            value = await fetch()
+            self._cache.set(key, (value, time.monotonic()))
+            return value
+        finally:
+            self._tasks.pop(key, None)
+
+    async def aget(self, key, fetch):
+        """Async `get`: `fetch` is a coroutine function, awaited once for all concurrent callers."""
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        task = self._tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self._tasks[key] = asyncio.create_task(self._arun(key, fetch))
+            # a refresh nobody waits for anymore must not log "exception was never retrieved"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        # shielded: a caller that is cancelled (e.g. tool timeout) doesn't cancel the fetch of the others
+        if entry is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.stale_wait)
+        except Exception:  # refresh still running or failed
+            self.stale_served += 1
+            return entry[0]
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return {**self._cache.stats(), "coalesced": self.coalesced, "stale_served": self.stale_served}
@@ -0,0 +1,135 @@
+"""Pooled, batching client for the CoinMarketCap quotes endpoint.
+
+One `httpx.AsyncClient` (keep-alive, timeouts) is shared by every caller. It runs on its
+own event loop in a daemon thread, so sync tool calls (worker threads) and async callers
+use the same connection pool. Slugs requested within `batch_window` seconds of each other
+are merged into one `?slug=a,b,c` call (at most `max_batch` per call) and the quotes are
+fanned back out to the callers. The call sets `skip_invalid=true`, so an unknown slug only
+fails its own callers (`PriceNotFound`), not the whole batch.
+
+`CMC_BASE_URL` points the client at another server, e.g. a local stub for testing.
+"""
+import os
+import asyncio
+import logging
+import threading
+
+import httpx
+
+logger = logging.getLogger("file_api_logger")
+
+CMC_BASE_URL = os.getenv("CMC_BASE_URL", "https://pro-api.coinmarketcap.com")
+CMC_TIMEOUT = float(os.getenv("CMC_TIMEOUT", "10"))
+CMC_BATCH_WINDOW = float(os.getenv("CMC_BATCH_WINDOW", "0.02"))  # seconds
+CMC_MAX_BATCH = int(os.getenv("CMC_MAX_BATCH", "50"))
+QUOTES_PATH = "/v2/cryptocurrency/quotes/latest"
+
+
+class PriceNotFound(KeyError):
+    pass
+
+
+class CoinMarketCapClient:
+    def __init__(self, api_key, base_url=CMC_BASE_URL, timeout=CMC_TIMEOUT, batch_window=CMC_BATCH_WINDOW,
+                 max_batch=CMC_MAX_BATCH, convert="USD"):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.convert = convert
+        self._loop = None
+        self._client = None
+        self._start_lock = threading.Lock()
+        self._pending = {}  # slug -> futures waiting for it (only touched on the client loop)
+        self._flush_handle = None
+        self.upstream_calls = 0
+        self.requested_slugs = 0
+
+    # --- client loop ---
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="coinmarketcap", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Accepts": "application/json", "X-CMC_PRO_API_KEY": self.api_key or ""},
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            )
+        return self._client
+
+    def _enqueue(self, slug):
+        """Runs on the client loop: register a waiter for `slug` and schedule the batch flush."""
+        future = self._loop.create_future()
+        self._pending.setdefault(slug, []).append(future)
+        self.requested_slugs += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.batch_window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._loop.create_task(self._fetch(batch))
+
+    async def _fetch(self, batch):
+        self.upstream_calls += 1
+        try:
+            response = await self._get_client().get(
+                QUOTES_PATH, params={"slug": ",".join(batch), "convert": self.convert, "skip_invalid": "true"})
+            if response.status_code == 400 and "slug" in response.text:
+                # with skip_invalid, a 400 about the slugs means that none of them is valid
+                logger.warning(f"CoinMarketCap found none of {list(batch)}: {response.text[:200]}", extra={"api_path": "get_price"})
+                quotes = {}
+            else:
+                response.raise_for_status()
+                quotes = {item["slug"]: item for item in response.json()["data"].values()}
+        except Exception as e:
+            logger.error(f"CoinMarketCap request failed for {list(batch)}: {e}", extra={"api_path": "get_price"})
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for slug, futures in batch.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if slug in quotes:
+                    future.set_result(quotes[slug]["quote"][self.convert]["price"])
+                else:
+                    future.set_exception(PriceNotFound(slug))
+
+    async def _price(self, slug):
+        return await self._enqueue(slug)
+
+    # --- callers ---
+    def price(self, slug):
+        """Blocking: current price of `slug` (called from worker threads, not from an event loop)."""
+        return asyncio.run_coroutine_threadsafe(self._price(slug), self._ensure_started()).result()
+
+    async def aprice(self, slug):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._price(slug), self._ensure_started()))
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = self._client = None
+
+    def stats(self):
+        return {"upstream_calls": self.upstream_calls, "requested_slugs": self.requested_slugs}
@@ -0,0 +1,207 @@
+"""Persistent, content-addressed cache in front of an embeddings model.
+
+Vectors are keyed by sha256(model name, text) and stored on disk as:
+
+    <cache_dir>/<model>/vectors.f32   float32 rows, appended, read through np.memmap
+    <cache_dir>/<model>/index.txt     one key per line, line i <-> row i
+    <cache_dir>/<model>/meta.json     {"model": ..., "dim": ...}
+
+Both files are append-only, so a crash can at worst leave a trailing partial row.
+Readers ignore rows without a key (and keys without a row); a writer truncates that
+unmatched tail before its first append, so rows and keys line up again.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("file_api_logger")
+
+
+def _model_name(embeddings):
+    return getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an `Embeddings` instance and only calls it for texts it has never seen.
+
+    Document embeddings are persisted. Query embeddings are looked up in the persisted
+    cache too, but new ones are kept in a bounded in-memory LRU unless `persist_queries`
+    is set, so serving processes never write to the shared files.
+    """
+
+    def __init__(self, embeddings, cache_dir="data/embedding_cache", batch_size=512,
+                 persist_queries=False, max_query_entries=10000):
+        self.embeddings = embeddings
+        self.model = _model_name(embeddings)
+        self.batch_size = batch_size
+        self.persist_queries = persist_queries
+        self.max_query_entries = max_query_entries
+
+        self.cache_dir = os.path.join(cache_dir, self.model.replace("/", "_"))
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self._index_path = os.path.join(self.cache_dir, "index.txt")
+        self._meta_path = os.path.join(self.cache_dir, "meta.json")
+
+        self._lock = threading.Lock()
+        self._rows = {}  # key -> row in vectors.f32
+        self._n_rows = 0  # rows in vectors.f32, can exceed len(self._rows) for older files with duplicate keys
+        self._dim = None
+        self._matrix = None  # memmap over vectors.f32, re-opened when rows are appended
+        self._writer = False  # set by the first append, which repairs the files first
+        self._query_cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    # --- storage ---
+    def _load(self, repair=False):
+        """Map the rows that have a key. With `repair`, truncate the unmatched tail of the files:
+        only a writer does, a reader could otherwise cut a row another process is appending."""
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r") as f:
+            self._dim = json.load(f)["dim"]
+        keys = []
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r") as f:
+                keys = f.read().split()
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        n_rows = size // (4 * self._dim)
+        n = min(len(keys), n_rows)
+        if repair and (len(keys) != n_rows or size != n_rows * 4 * self._dim):
+            # Interrupted append: drop the unmatched tail so rows and keys line up again
+            logger.warning(f"Embedding cache index/vectors mismatch ({len(keys)} keys, {n_rows} rows), truncating to {n}", extra={"api_path": "embedding_cache"})
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(n * 4 * self._dim)
+            with open(self._index_path, "w") as f:
+                f.write("".join(f"{key}\n" for key in keys[:n]))
+        # a key written twice keeps its first row, later rows are never read
+        self._rows = {}
+        for row, key in enumerate(keys[:n]):
+            self._rows.setdefault(key, row)
+        self._n_rows = n
+        self._matrix = None
+        logger.info(f"Embedding cache loaded: {len(self._rows)} vectors for {self.model}", extra={"api_path": "embedding_cache"})
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            return self._query_cache.get(key)
+        if self._matrix is None or self._matrix.shape[0] <= row:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._n_rows, self._dim))
+        return self._matrix[row].tolist()
+
+    def _append(self, keys, vectors):
+        """Persist new vectors. Must be called with the lock held.
+        Keys stored meanwhile (e.g. by a concurrent miss on the same text) are skipped."""
+        if not self._writer:
+            # rows appended since this process loaded the files must be counted before writing after them
+            self._load(repair=True)
+            self._writer = True
+        new = {}
+        for key, vector in zip(keys, vectors):
+            if key not in self._rows:
+                new.setdefault(key, vector)
+        if not new:
+            return
+        keys = list(new)
+        matrix = np.asarray(list(new.values()), dtype=np.float32)
+        if self._dim is None:
+            self._dim = matrix.shape[1]
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._meta_path, "w") as f:
+                json.dump({"model": self.model, "dim": self._dim}, f)
+        with open(self._vectors_path, "ab") as f:
+            f.write(matrix.tobytes())
+        with open(self._index_path, "a") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        for key in keys:
+            self._rows[key] = self._n_rows
+            self._n_rows += 1
+
+    def _remember_query(self, key, vector):
+        self._query_cache[key] = vector
+        self._query_cache.move_to_end(key)
+        while len(self._query_cache) > self.max_query_entries:
+            self._query_cache.popitem(last=False)
+
+    def _lookup(self, texts):
+        """Return (keys, cached vectors with None for misses, {key: text} of the misses)."""
+        keys = [self._key(t) for t in texts]
+        with self._lock:
+            vectors = [self._get(key) for key in keys]
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(v is None for v in vectors)
+        self.misses += len(missing)
+        return keys, vectors, missing
+
+    # --- Embeddings interface ---
+    def embed_documents(self, texts):
+        keys, vectors, missing = self._lookup(texts)
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[i:i + self.batch_size]
+            new_vectors = self.embeddings.embed_documents([missing[k] for k in batch])
+            with self._lock:
+                self._append(batch, new_vectors)
+        return self._fill(keys, vectors)
+
+    async def aembed_documents(self, texts):
+        keys, vectors, missing = self._lookup(texts)
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[i:i + self.batch_size]
+            new_vectors = await self.embeddings.aembed_documents([missing[k] for k in batch])
+            with self._lock:
+                self._append(batch, new_vectors)
+        return self._fill(keys, vectors)
+
+    def embed_query(self, text):
+        keys, vectors, _ = self._lookup([text])
+        if vectors[0] is not None:
+            return vectors[0]
+        vector = self.embeddings.embed_query(text)
+        self._store_query(keys[0], vector)
+        return vector
+
+    async def aembed_query(self, text):
+        keys, vectors, _ = self._lookup([text])
+        if vectors[0] is not None:
+            return vectors[0]
+        vector = await self.embeddings.aembed_query(text)
+        self._store_query(keys[0], vector)
+        return vector
+
+    def _store_query(self, key, vector):
+        with self._lock:
+            if self.persist_queries:
+                self._append([key], [vector])
+            else:
+                self._remember_query(key, vector)
+
+    def _fill(self, keys, vectors):
+        with self._lock:
+            return [v if v is not None else self._get(k) for k, v in zip(keys, vectors)]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model,
+            "entries": len(self._rows),
+            "query_entries": len(self._query_cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
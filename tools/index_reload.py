@@ -0,0 +1,59 @@
+"""Retriever that follows re-ingestion.
+
+The serving process opens the BM25 index and the local vector index from disk. When the
+ingestion CLI updates them it rewrites the manifest last, so the manifest version (see
+`tools.qa_cache.index_version`) tells when the copies in memory are stale.
+"""
+import asyncio
+import logging
+import threading
+from typing import Callable
+
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from tools.qa_cache import index_version
+
+logger = logging.getLogger("file_api_logger")
+
+
+class ReloadingRetriever(BaseRetriever):
+    """Retrieves from the indexes as of the current manifest version.
+
+    `load()` opens the indexes and returns (retriever, async retriever). It is called on the
+    first query and again on the next query after the manifest changes, so stale BM25 chunks
+    are never fused with current vector results.
+    """
+
+    load: Callable
+    manifest_path: str
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    _retrievers = PrivateAttr(default=None)
+    _version = PrivateAttr(default=None)
+    _lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _stale(self):
+        return index_version(self.manifest_path) != self._version
+
+    def _reload(self):
+        with self._lock:
+            version = index_version(self.manifest_path)
+            if version == self._version:
+                return  # reloaded by a concurrent query
+            if self._version is not None:
+                logger.info("Index manifest changed, reloading the indexes", extra={"api_path": "index_reload"})
+            self._retrievers = self.load()
+            self._version = version
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self._stale():
+            self._reload()
+        return self._retrievers[0].invoke(query, config={"callbacks": run_manager.get_child()})
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        if self._stale():
+            # reading the index files would block the event loop
+            await asyncio.to_thread(self._reload)
+        return await self._retrievers[1].ainvoke(query, config={"callbacks": run_manager.get_child()})
@@ -0,0 +1,312 @@
+"""Offline ingestion of PDFs into the RAG index.
+
+Run once (and again whenever the PDFs change) instead of re-embedding at import time:
+
+    python -m tools.ingest data/attention.pdf
+    python -m tools.ingest data/papers/ --prune
+
+Each PDF is streamed through pages -> cleaned text -> chunks -> embedding batches and
+written to the index incrementally, so the pages and chunks in flight are bounded by the
+batch size. The BM25 index, and the vector index with VECTOR_BACKEND=local, do hold every
+chunk in memory; their checkpoints only append the chunks added or removed since the
+previous checkpoint. The manifest (chunk ids only) is rewritten at each checkpoint.
+
+A manifest of content hashes is kept next to the data so that unchanged documents are
+skipped and, for changed documents, only new chunks are embedded and stale ones deleted.
+"""
+from dotenv import load_dotenv
+import os
+import re
+import json
+import hashlib
+import argparse
+
+load_dotenv()
+
+import logging  # Import Python's built-in logging module
+
+os.makedirs("logs", exist_ok=True)  # Create a "logs" directory if it doesn't exist
+
+logger = logging.getLogger("file_api_logger")  # Create a custom logger named "file_api_logger"
+logger.setLevel(logging.INFO)  # Set logging level to INFO
+
+if not logger.handlers:  # the serving modules may already have attached the handler
+    file_handler = logging.FileHandler("logs/app.log")  # Log messages will be written to logs/app.log
+    file_handler.setFormatter(logging.Formatter(  # Define the format of log messages
+        "%(asctime)s, %(api_path)s, %(levelname)s, %(message)s",
+        datefmt="%Y-%m-%d, %H:%M:%S"
+    ))
+    logger.addHandler(file_handler)  # Add the file handler to the logger
+
+from langchain_core.documents import Document
+from tools.ocr import ocr_pages
+from tools.bm25 import BM25Index
+from tools.vectorstore import MANIFEST_PATH
+
+DEFAULT_SOURCES = ["data/attention.pdf"]
+
+LOW_TEXT_CHARS = 1500  # pages with fewer extracted characters are OCR'd
+MIN_OCR_CHARS = 100  # To delete short texts or low quality images
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+EMBED_BATCH_SIZE = 256  # chunks embedded and written per vector store call
+CHECKPOINT_EVERY = 10  # changed documents between index/manifest checkpoints
+
+
+#cleans the text
+def clean_text(text):
+    text = re.sub(r'[^\x00-\x7F]+', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def file_hash(path):
+    """sha256 of the raw file bytes, used to detect changed documents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(doc):
+    """Deterministic id of a chunk: the hash of its source, page and text.
+
+    Used as the vector store id, so re-adding an unchanged chunk is a no-op instead of a duplicate row.
+    """
+    key = f"{doc.metadata.get('source')}|{doc.metadata.get('page_number')}|{doc.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def iter_pdf_paths(sources):
+    """Yield the PDF files in `sources`, walking directories recursively."""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+
+def source_name(pdf_path):
+    """Key of a document in the manifest and its chunks' `source` metadata (relative path, not just
+    the file name, so PDFs with the same name in different folders don't collide)."""
+    return os.path.relpath(pdf_path).replace(os.sep, "/")
+
+
+def iter_pages(pdf_path, ocr_workers=None):
+    """Yield the cleaned pages of one PDF.
+
+    Pages are read lazily; pages with low text are held back (only their numbers) and
+    yielded at the end with their OCR text, so at most one page is in memory at a time.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+
+    source = source_name(pdf_path)
+    logger.info(f"Loading PDF: {pdf_path}", extra={"api_path": "load_pdf"})
+    low_text_pages = []
+    n_pages = 0
+    for i, doc in enumerate(PyPDFLoader(pdf_path).lazy_load()):
+        n_pages += 1
+        #checking the character numbers of each page(pypdfloader)
+        text_length = len(doc.page_content.strip())
+        if text_length < LOW_TEXT_CHARS:
+            logger.warning(f"Page {i + 1} has low text ({text_length} chars)", extra={"api_path": "check_low_text"})
+            low_text_pages.append(i)
+            continue
+        yield Document(page_content=clean_text(doc.page_content), metadata={"source": source, "page": i, "page_number": i})
+    logger.info(f"{n_pages} pages loaded.", extra={"api_path": "load_pdf"})
+
+    if not low_text_pages:
+        return
+    #replacing low-text pages with the text extracted by ocr
+    for item in ocr_pages(pdf_path, low_text_pages, workers=ocr_workers):
+        page_number = item["page"]
+        text = item["text"].strip()
+        if len(text) > MIN_OCR_CHARS:
+            logger.info(f"OCR Document created for page {page_number+1}", extra={"api_path": "OCR"})
+            yield Document(page_content=clean_text(text), metadata={"source": source, "page": page_number, "page_number": page_number})
+        else:
+            print(f"Skipped page {page_number+1} due to short OCR text")
+
+
+def iter_chunks(pages):
+    """Split pages into chunks one page at a time and tag each chunk with its content hash."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ".", " ", ""]
+    )
+    for page in pages:
+        for doc in text_splitter.split_documents([page]):
+            doc.metadata["chunk_id"] = chunk_id(doc)
+            yield doc
+
+
+def batched(iterable, size):
+    """Yield lists of at most `size` items; the only buffering in the pipeline."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Manifest ---
+def load_manifest(path=MANIFEST_PATH):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"documents": {}}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Write the manifest atomically so an interrupted run never leaves it half written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def chunking_params():
+    return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+
+def persist(vectorstore):
+    """Write in-process indexes to disk; PGVector commits on every call and has nothing to do."""
+    save = getattr(vectorstore, "save", None)
+    if save:
+        save()
+
+
+def ingest_document(vectorstore, bm25, pdf_path, old_ids, batch_size=EMBED_BATCH_SIZE, ocr_workers=None):
+    """Stream one PDF into the index: pages -> chunks -> batches of new chunks -> vector store and BM25 index.
+
+    Only the chunk ids of the document are kept in memory. Returns (chunk ids, added, deleted).
+    """
+    chunk_ids = []
+    seen = set()
+
+    def new_chunks():
+        for doc in iter_chunks(iter_pages(pdf_path, ocr_workers=ocr_workers)):
+            cid = doc.metadata["chunk_id"]
+            if cid in seen:  # The same text can occur twice on a page
+                continue
+            seen.add(cid)
+            chunk_ids.append(cid)
+            if cid not in old_ids:
+                yield doc
+
+    added = 0
+    for batch in batched(new_chunks(), batch_size):
+        ids = [doc.metadata["chunk_id"] for doc in batch]
+        vectorstore.add_documents(batch, ids=ids)
+        bm25.add_documents(batch, ids)
+        added += len(batch)
+
+    stale_ids = [cid for cid in old_ids if cid not in seen]
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        bm25.remove(stale_ids)
+    return chunk_ids, added, len(stale_ids)
+
+
+def ingest(sources, rebuild=False, prune=False, manifest_path=MANIFEST_PATH, ocr_workers=None,
+           batch_size=EMBED_BATCH_SIZE, checkpoint_every=CHECKPOINT_EVERY):
+    """Bring the index in line with `sources` (PDF files and/or directories), embedding only new or changed chunks.
+
+    Documents are streamed one at a time and written in batches of `batch_size` chunks; the
+    index and the manifest are checkpointed every `checkpoint_every` changed documents.
+    The manifest is per backend (VECTOR_BACKEND), use a separate `manifest_path` for each.
+
+    Returns a dict with the number of added and deleted chunks.
+    """
+    from tools.vectorstore import get_vectorstore, collection_name, BM25_INDEX_PATH
+
+    vectorstore = get_vectorstore()
+    bm25 = BM25Index.load(BM25_INDEX_PATH)
+    manifest = load_manifest(manifest_path)
+
+    if rebuild or manifest.get("collection") != collection_name or manifest.get("chunking") != chunking_params():
+        # Start from an empty collection: this also drops duplicate rows left by older import-time indexing
+        logger.info(f"Rebuilding collection {collection_name}", extra={"api_path": "ingest"})
+        vectorstore.delete_collection()
+        vectorstore.create_collection()
+        bm25.clear()
+        manifest = {"documents": {}}
+    manifest["collection"] = collection_name
+    manifest["chunking"] = chunking_params()
+
+    def checkpoint():
+        persist(vectorstore)
+        bm25.save(BM25_INDEX_PATH)
+        save_manifest(manifest, manifest_path)
+
+    added = deleted = 0
+    pending = 0  # changed documents since the last checkpoint
+    current = set()
+    for pdf_path in iter_pdf_paths(sources):
+        source = source_name(pdf_path)
+        current.add(source)
+        doc_hash = file_hash(pdf_path)
+        entry = manifest["documents"].get(source)
+        if entry and entry["doc_hash"] == doc_hash:
+            logger.info(f"{source} unchanged, skipping", extra={"api_path": "ingest"})
+            continue
+
+        old_ids = set(entry["chunks"]) if entry else set()
+        chunk_ids, doc_added, doc_deleted = ingest_document(vectorstore, bm25, pdf_path, old_ids, batch_size=batch_size, ocr_workers=ocr_workers)
+        manifest["documents"][source] = {"doc_hash": doc_hash, "chunks": chunk_ids}
+        added += doc_added
+        deleted += doc_deleted
+        logger.info(f"{source}: {doc_added} chunks added, {doc_deleted} removed", extra={"api_path": "ingest"})
+
+        # Chunk ids are deterministic, so work lost between checkpoints is redone as upserts, not duplicates
+        pending += 1
+        if pending >= checkpoint_every:
+            checkpoint()
+            pending = 0
+
+    if prune:
+        for source in [s for s in manifest["documents"] if s not in current]:
+            stale_ids = manifest["documents"].pop(source)["chunks"]
+            if stale_ids:
+                vectorstore.delete(ids=stale_ids)
+                bm25.remove(stale_ids)
+            deleted += len(stale_ids)
+            logger.info(f"{source} no longer in sources, {len(stale_ids)} chunks removed", extra={"api_path": "ingest"})
+
+    checkpoint()
+    from tools.vectorstore import embeddings
+    logger.info(f"Embedding cache: {embeddings.stats()}", extra={"api_path": "ingest"})
+    return {"added": added, "deleted": deleted, "embedding_cache": embeddings.stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index PDFs into the RAG vector store.")
+    parser.add_argument("sources", nargs="*", default=DEFAULT_SOURCES, help="PDF files or directories of PDFs to index")
+    parser.add_argument("--rebuild", action="store_true", help="drop the collection and re-embed everything")
+    parser.add_argument("--prune", action="store_true", help="remove documents that are no longer in sources")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="path of the manifest file")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="OCR processes (default: OCR_WORKERS or CPU count)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks embedded and written per batch")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="documents between index/manifest checkpoints")
+    args = parser.parse_args(argv)
+
+    stats = ingest(args.sources, rebuild=args.rebuild, prune=args.prune, manifest_path=args.manifest, ocr_workers=args.ocr_workers,
+                   batch_size=args.batch_size, checkpoint_every=args.checkpoint_every)
+    print(f"Ingestion done: {stats['added']} chunks added, {stats['deleted']} chunks removed.")
+    cache = stats["embedding_cache"]
+    print(f"Embedding cache: {cache['hits']} hits, {cache['misses']} misses ({cache['entries']} vectors stored).")
+
+
+if __name__ == "__main__":
+    main()
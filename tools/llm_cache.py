@@ -0,0 +1,102 @@
+"""Opt-in response cache for the chat models that are not streamed (history summarizer, RAG chain LLM).
+
+The agent's own model is not cached: LangChain returns a cache hit without streaming it, so
+/chat/stream would get no tokens for exactly the requests that hit the cache.
+
+LangChain calls `lookup(prompt, llm_string)` before every model call, where `prompt` is the
+serialized message list and `llm_string` holds the model name, its parameters and any bound
+tools. Responses are kept in an in-memory LRU and, with `LLM_CACHE_DB` set, in a SQLite tier
+shared across restarts, both with a TTL and a size limit.
+
+Enable it with `LLM_CACHE=1`; models get it through `ChatOpenAI(..., cache=llm_cache)`.
+A single call can skip the cache with:
+
+    with bypass_llm_cache():
+        model.invoke(messages)
+"""
+import os
+import hashlib
+import logging
+import contextlib
+import contextvars
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from tools.cache import TTLCache, SQLiteCache
+
+logger = logging.getLogger("file_api_logger")
+
+LLM_CACHE = os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB") or None  # e.g. data/llm_cache.sqlite
+LLM_CACHE_DB_MAX_ROWS = int(os.getenv("LLM_CACHE_DB_MAX_ROWS", "50000"))
+
+# set by bypass_llm_cache(); copied into threads/tasks started from the same context
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextlib.contextmanager
+def bypass_llm_cache():
+    """Neither read nor write the cache for model calls made inside the block."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+class LLMResponseCache(BaseCache):
+    def __init__(self, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, db_path=LLM_CACHE_DB, db_max_rows=LLM_CACHE_DB_MAX_ROWS):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.persistent = SQLiteCache(db_path, ttl=ttl, table="llm_cache") if db_path else None
+        self.db_max_rows = db_max_rows
+        self._writes = 0
+
+    def _key(self, prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        if _bypass.get():
+            return None
+        key = self._key(prompt, llm_string)
+        generations = self.memory.get(key)
+        if generations is None and self.persistent is not None:
+            serialized = self.persistent.get(key)
+            if serialized is not None:
+                try:
+                    generations = [loads(g, allowed_objects="core") for g in serialized]
+                except Exception as e:
+                    logger.warning(f"Dropping unreadable LLM cache entry: {e}", extra={"api_path": "llm_cache"})
+                    self.persistent.delete(key)
+                    return None
+                self.memory.set(key, generations)
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        if _bypass.get():
+            return
+        key = self._key(prompt, llm_string)
+        self.memory.set(key, return_val)
+        if self.persistent is not None:
+            self.persistent.set(key, [dumps(g) for g in return_val])
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.persistent.purge_expired()
+                self.persistent.trim(self.db_max_rows)
+
+    def clear(self, **kwargs):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self):
+        stats = self.memory.stats()
+        if self.persistent is not None:
+            stats["persistent_size"] = len(self.persistent)
+        return stats
+
+
+# shared by every model; None (no caching) unless LLM_CACHE is set
+llm_cache = LLMResponseCache() if LLM_CACHE else None
@@ -0,0 +1,339 @@
+"""In-process vector index, an alternative to PGVector for corpora that fit in RAM.
+
+The chunk embeddings are held in a float32 matrix whose capacity doubles as rows are added.
+Small corpora are searched exactly with NumPy; larger ones go through a FAISS HNSW or IVF
+index built lazily from the same matrix. The index is persisted to a directory as a log:
+
+    <index_dir>/CURRENT             generation of the two files below
+    <index_dir>/vectors-<gen>.f32   float32 rows, L2-normalized, appended by each save()
+    <index_dir>/docs-<gen>.jsonl    {"dim": ...}, then per save() the rows it appended
+                                    ({"start", "ids", "texts", "metadatas"}) and the rows it deleted
+
+save() only appends what changed since the previous save(). Deleted rows are masked, and
+rewritten away (into a new generation) once they outnumber the live rows. The first save()
+of a process also starts a new generation, so it never appends after the partial tail of a
+crashed writer; readers ignore such a tail.
+
+Being a LangChain `VectorStore`, it keeps `as_retriever(search_kwargs={"k": 5})` working.
+"""
+import os
+import glob
+import json
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger("file_api_logger")
+
+EXACT_SEARCH_MAX_ROWS = 50_000  # "auto" switches from NumPy to FAISS HNSW above this
+IVF_MIN_ROWS = 1_000  # too few rows to train IVF centroids, "ivf" uses a flat FAISS index below this
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex(VectorStore):
+    """Cosine-similarity index kept in memory and persisted to `index_dir`.
+
+    `kind` is "exact", "hnsw", "ivf" or "auto" (exact up to EXACT_SEARCH_MAX_ROWS rows, HNSW above).
+    """
+
+    def __init__(self, embeddings, index_dir="data/local_index", kind="auto"):
+        self._embeddings = embeddings
+        self.index_dir = index_dir
+        self.kind = kind
+        self._reset()
+
+    def _reset(self):
+        self._matrix = np.zeros((0, 0), dtype=np.float32)  # rows [0, _n) are used, the rest is spare capacity
+        self._live = np.zeros(0, dtype=bool)  # deleted and replaced rows are masked until compaction
+        self._n = 0
+        self._ids = []  # per row, live or not
+        self._texts = []
+        self._metadatas = []
+        self._rows = {}  # id -> row, live rows only
+        self._faiss = None  # (FAISS index, rows it holds), built on first search after a change
+        self._generation = None  # of the files this process appends to, None until its first save()
+        self._saved = 0  # rows already in the files
+        self._saved_dim = 0  # dim in the header of the files, 0 while they hold no rows
+        self._deleted = []  # rows deleted since the last save()
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    @property
+    def _vectors(self):
+        return self._matrix[:self._n]
+
+    def __len__(self):
+        return len(self._rows)
+
+    # --- persistence ---
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    @classmethod
+    def load(cls, embeddings, index_dir="data/local_index", kind="auto"):
+        """Open the index saved in `index_dir` (empty if nothing was saved yet)."""
+        index = cls(embeddings, index_dir=index_dir, kind=kind)
+        for attempt in range(3):
+            try:
+                index._read()
+                break
+            except FileNotFoundError:
+                # a writer compacted into a new generation and removed the files being read
+                if attempt == 2:
+                    raise
+        if index._rows:
+            logger.info(f"Local vector index loaded: {len(index)} vectors from {index_dir}", extra={"api_path": "local_index"})
+        return index
+
+    def _read(self):
+        self._reset()
+        if not os.path.exists(self._path("CURRENT")):
+            self._read_legacy()
+            return
+        with open(self._path("CURRENT"), "r") as f:
+            generation = int(f.read())
+        with open(self._path(f"docs-{generation}.jsonl"), "r") as f:
+            lines = f.read().split("\n")
+        dim = json.loads(lines[0])["dim"]
+        if not dim:
+            return
+        vectors = np.fromfile(self._path(f"vectors-{generation}.f32"), dtype=np.float32)
+        n_rows = vectors.size // dim
+        vectors = vectors[:n_rows * dim].reshape(n_rows, dim)
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # the last line is empty or still being appended
+            if "delete" in record:
+                self._delete_rows(record["delete"])
+                continue
+            end = record["start"] + len(record["ids"])
+            if end > n_rows:
+                break  # rows still being appended
+            self._append_rows(vectors[record["start"]:end], record["ids"], record["texts"], record["metadatas"])
+        self._deleted = []
+
+    def _read_legacy(self):
+        """vectors.npy + docs.json, written whole by earlier versions; replaced by the first save()."""
+        docs_path = self._path("docs.json")
+        if os.path.exists(docs_path):
+            with open(docs_path, "r") as f:
+                docs = json.load(f)
+            self._append_rows(np.load(self._path("vectors.npy")), docs["ids"], docs["texts"], docs["metadatas"])
+
+    def save(self):
+        """Append the rows added and deleted since the last save(); readers ignore a half written tail."""
+        dead = self._n - len(self._rows)
+        if self._generation is None or dead > len(self._rows) or (self._n and not self._saved_dim):
+            self._write_generation()
+            return
+        records = []
+        if self._saved < self._n:
+            with open(self._path(f"vectors-{self._generation}.f32"), "ab") as f:
+                f.write(self._matrix[self._saved:self._n].tobytes())
+            records.append(self._rows_record(self._saved, self._n))
+        if self._deleted:
+            records.append({"delete": self._deleted})
+        with open(self._path(f"docs-{self._generation}.jsonl"), "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        self._saved = self._n
+        self._deleted = []
+
+    def _rows_record(self, start, end):
+        return {"start": start, "ids": self._ids[start:end], "texts": self._texts[start:end], "metadatas": self._metadatas[start:end]}
+
+    def _write_generation(self):
+        """Compact the live rows into new files, then point CURRENT at them."""
+        self._compact()
+        os.makedirs(self.index_dir, exist_ok=True)
+        generation = 1
+        if os.path.exists(self._path("CURRENT")):
+            with open(self._path("CURRENT"), "r") as f:
+                generation = int(f.read()) + 1
+        dim = self._matrix.shape[1] if self._n else 0
+        with open(self._path(f"vectors-{generation}.f32"), "wb") as f:
+            f.write(self._vectors.tobytes())
+        with open(self._path(f"docs-{generation}.jsonl"), "w") as f:
+            f.write(json.dumps({"dim": int(dim)}) + "\n")
+            if self._n:
+                f.write(json.dumps(self._rows_record(0, self._n)) + "\n")
+        current_tmp = self._path("CURRENT.tmp")
+        with open(current_tmp, "w") as f:
+            f.write(str(generation))
+        os.replace(current_tmp, self._path("CURRENT"))
+
+        keep = {self._path(f"vectors-{generation}.f32"), self._path(f"docs-{generation}.jsonl")}
+        old = glob.glob(self._path("vectors-*.f32")) + glob.glob(self._path("docs-*.jsonl")) + [self._path("vectors.npy"), self._path("docs.json")]
+        for path in old:
+            if path not in keep and os.path.exists(path):
+                os.remove(path)
+        self._generation = generation
+        self._saved_dim = dim
+        self._saved = self._n
+        self._deleted = []
+
+    def _compact(self):
+        if len(self._rows) == self._n:
+            return
+        rows = np.flatnonzero(self._live[:self._n])
+        self._matrix = self._matrix[rows]
+        self._live = np.ones(len(rows), dtype=bool)
+        self._ids = [self._ids[row] for row in rows]
+        self._texts = [self._texts[row] for row in rows]
+        self._metadatas = [self._metadatas[row] for row in rows]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._n = len(rows)
+        self._faiss = None
+
+    # Same names as PGVector so the ingestion CLI can reset either backend
+    def delete_collection(self):
+        self._reset()  # the next save() writes a new, empty generation
+
+    def create_collection(self):
+        pass
+
+    # --- writes ---
+    def _append_rows(self, vectors, ids, texts, metadatas):
+        n = len(ids)
+        if not n:
+            return
+        if self._n + n > len(self._matrix) or self._matrix.shape[1] != vectors.shape[1]:
+            # grow geometrically, so adding a corpus batch by batch copies each row O(1) times
+            capacity = max(2 * len(self._matrix), self._n + n, 1024)
+            matrix = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._n:
+                matrix[:self._n] = self._matrix[:self._n]
+            live = np.zeros(capacity, dtype=bool)
+            live[:self._n] = self._live[:self._n]
+            self._matrix, self._live = matrix, live
+        self._matrix[self._n:self._n + n] = vectors
+        self._live[self._n:self._n + n] = True
+        for row, doc_id in enumerate(ids, start=self._n):
+            # Adding an existing id replaces it, like an upsert
+            old = self._rows.get(doc_id)
+            if old is not None:
+                self._live[old] = False
+            self._rows[doc_id] = row
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        self._n += n
+        self._faiss = None
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if ids is None:
+            import uuid
+            ids = [str(uuid.uuid4()) for _ in texts]
+        ids = list(ids)
+
+        vectors = _normalize(np.asarray(self._embeddings.embed_documents(texts), dtype=np.float32))
+        self._append_rows(vectors, ids, texts, metadatas)
+        return ids
+
+    def _delete_rows(self, rows):
+        for row in rows:
+            self._live[row] = False
+            if self._rows.get(self._ids[row]) == row:
+                del self._rows[self._ids[row]]
+        self._faiss = None
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return True
+        rows = [self._rows[doc_id] for doc_id in set(ids) if doc_id in self._rows]
+        if rows:
+            self._delete_rows(rows)
+            self._deleted.extend(rows)
+        return True
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        index = cls(embedding, **kwargs)
+        index.add_texts(texts, metadatas=metadatas, ids=ids)
+        return index
+
+    # --- search ---
+    def _search_kind(self):
+        if self.kind != "auto":
+            return self.kind
+        return "exact" if len(self._rows) <= EXACT_SEARCH_MAX_ROWS else "hnsw"
+
+    def _build_faiss(self, kind):
+        """FAISS index over the live rows, with the row of each of its entries."""
+        import faiss
+
+        rows = np.flatnonzero(self._live[:self._n])
+        vectors = self._matrix[rows]
+        dim = vectors.shape[1]
+        if kind == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = 64
+        elif len(rows) < IVF_MIN_ROWS:
+            index = faiss.IndexFlatIP(dim)
+        else:
+            # FAISS k-means wants at least 39 training points per centroid
+            nlist = min(int(4 * np.sqrt(len(rows))), len(rows) // 39)
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.nprobe = min(nlist, 16)
+        index.add(vectors)
+        logger.info(f"Built FAISS {kind} index over {len(rows)} vectors", extra={"api_path": "local_index"})
+        return index, rows
+
+    def _top_k(self, query_vector, k):
+        """Return [(row, cosine similarity)] of the k nearest rows."""
+        if not self._rows:
+            return []
+        k = min(k, len(self._rows))
+        query = _normalize(np.asarray([query_vector], dtype=np.float32))
+        kind = self._search_kind()
+        if kind == "exact":
+            scores = self._vectors @ query[0]
+            scores[~self._live[:self._n]] = -np.inf
+            rows = np.argpartition(-scores, k - 1)[:k]
+            rows = rows[np.argsort(-scores[rows])]
+            return [(int(r), float(scores[r])) for r in rows]
+
+        if self._faiss is None:
+            self._faiss = self._build_faiss(kind)
+        index, index_rows = self._faiss
+        scores, hits = index.search(query, k)
+        return [(int(index_rows[h]), float(s)) for h, s in zip(hits[0], scores[0]) if h != -1]
+
+    def _document(self, row):
+        return Document(page_content=self._texts[row], metadata=self._metadatas[row], id=self._ids[row])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return [(self._document(row), score) for row, score in self._top_k(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    async def asimilarity_search(self, query, k=4, **kwargs):
+        # Only the query embedding is I/O, the search itself is in-process
+        embedding = await self._embeddings.aembed_query(query)
+        return self.similarity_search_by_vector(embedding, k)
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities in [-1, 1], map them to [0, 1]
+        return lambda score: (score + 1.0) / 2.0
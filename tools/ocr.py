@@ -0,0 +1,81 @@
+"""OCR stage of the ingestion pipeline.
+
+Low text pages are rendered and recognized in a process pool, one page per task. Every
+page is rendered exactly once (in memory, no intermediate PNG) and its text is written
+to the `*_ocr_texts.json` cache as soon as it is done, so an interrupted run resumes
+where it stopped.
+"""
+import os
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger("file_api_logger")
+
+OCR_DPI = 300
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def ocr_cache_path(pdf_path):
+    return f"{os.path.splitext(pdf_path)[0]}_ocr_texts.json" #file name based on the PDF name
+
+
+def load_ocr_cache(path):
+    """Return {page: text} from the cache file (empty if it doesn't exist yet)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return {item["page"]: item["text"] for item in json.load(f)}
+
+
+def save_ocr_cache(path, texts):
+    """Atomically rewrite the cache, keeping its list-of-pages format."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump([{"page": page, "text": texts[page]} for page in sorted(texts)], f)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(tesseract_path):
+    import pytesseract
+
+    #manual configuration
+    if tesseract_path:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+
+
+def _ocr_page(pdf_path, page_num, poppler_path, dpi):
+    """Render a single page (0-based) and OCR it. Runs inside a worker process."""
+    from pdf2image import convert_from_path
+    import pytesseract
+
+    image = convert_from_path(pdf_path, dpi=dpi, poppler_path=poppler_path, first_page=page_num+1, last_page=page_num+1)[0]
+    return page_num, pytesseract.image_to_string(image)
+
+
+def ocr_pages(pdf_path, pages, workers=None, dpi=OCR_DPI):
+    """OCR `pages` (0-based page numbers) of a PDF, using and filling the json cache.
+
+    Returns a list of {"page", "text"} dicts sorted by page, like the cache file.
+    """
+    cache_path = ocr_cache_path(pdf_path)
+    texts = load_ocr_cache(cache_path)
+    missing = [p for p in pages if p not in texts]
+    if not missing:
+        print(f"{cache_path} already exists!")
+        return [{"page": p, "text": texts[p]} for p in sorted(pages)]
+
+    poppler_path = os.getenv("POPPLER_PATH")
+    tesseract_path = os.getenv("TESSERACT_PATH")
+    workers = max(1, min(workers or OCR_WORKERS, len(missing)))
+    logger.info(f"OCR of {len(missing)} pages of {pdf_path} with {workers} workers", extra={"api_path": "OCR"})
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tesseract_path,)) as pool:
+        futures = [pool.submit(_ocr_page, pdf_path, p, poppler_path, dpi) for p in missing]
+        for future in as_completed(futures):
+            page_num, text = future.result()
+            texts[page_num] = text
+            save_ocr_cache(cache_path, texts)  # page by page, so a crash doesn't lose completed work
+            logger.info(f"OCR text from page {page_num+1}: {len(text)} chars", extra={"api_path": "OCR"})
+
+    return [{"page": p, "text": texts[p]} for p in sorted(pages)]
@@ -0,0 +1,134 @@
+"""Answer cache in front of the RAG chain.
+
+Questions are normalized (case, whitespace, trailing punctuation) and looked up in an
+in-memory LRU, then in an optional SQLite tier. With `similarity` set, a miss also checks
+the embeddings of recently cached questions and reuses the answer of one that is close
+enough. Every entry is tagged with the version of the index manifest, so re-running the
+ingestion CLI invalidates all cached answers.
+
+Keys are standalone questions: rag_tool.py rewrites a follow-up with the session's history
+before the lookup, so answers can be shared across sessions.
+"""
+import os
+import re
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from tools.cache import TTLCache, SQLiteCache
+
+logger = logging.getLogger("file_api_logger")
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def index_version(manifest_path):
+    """Changes whenever the ingestion CLI rewrites the manifest."""
+    try:
+        stat = os.stat(manifest_path)
+    except FileNotFoundError:
+        return "none"
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class QACache:
+    def __init__(self, manifest_path, maxsize=1000, ttl=3600, db_path=None, embeddings=None, similarity=0.0):
+        self.manifest_path = manifest_path
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.persistent = SQLiteCache(db_path, ttl=ttl, table="qa_cache") if db_path else None
+        self.embeddings = embeddings
+        self.similarity = similarity  # 0 disables the semantic lookup
+        self._vectors = {}  # key -> normalized question embedding, for the semantic lookup
+        self._lock = threading.Lock()
+        self._version = index_version(manifest_path)
+        self.exact_hits = 0
+        self.persistent_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _key(self, normalized):
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _check_version(self):
+        version = index_version(self.manifest_path)
+        if version != self._version:
+            logger.info("Index manifest changed, clearing the QA cache", extra={"api_path": "qa_cache"})
+            self.invalidate()
+            self._version = version
+
+    def invalidate(self):
+        self.memory.clear()
+        with self._lock:
+            self._vectors.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def _embed(self, normalized):
+        vector = np.asarray(self.embeddings.embed_query(normalized), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, question):
+        """Return the cached answer or None."""
+        self._check_version()
+        normalized = normalize_question(question)
+        key = self._key(normalized)
+
+        answer = self.memory.get(key)
+        if answer is not None:
+            self.exact_hits += 1
+            return answer
+        if self.persistent is not None:
+            entry = self.persistent.get(key)
+            if entry and entry["version"] == self._version:
+                self.memory.set(key, entry["answer"])
+                self.persistent_hits += 1
+                return entry["answer"]
+
+        if self.similarity and self.embeddings is not None:
+            with self._lock:
+                keys = list(self._vectors)
+                matrix = np.stack([self._vectors[k] for k in keys]) if keys else None
+            if matrix is not None:
+                scores = matrix @ self._embed(normalized)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    answer = self.memory.get(keys[best])
+                    if answer is not None:
+                        self.semantic_hits += 1
+                        return answer
+                    with self._lock:
+                        self._vectors.pop(keys[best], None)  # expired or evicted from the memory tier
+
+        self.misses += 1
+        return None
+
+    def set(self, question, answer):
+        normalized = normalize_question(question)
+        key = self._key(normalized)
+        self.memory.set(key, answer)
+        if self.persistent is not None:
+            self.persistent.set(key, {"answer": answer, "version": self._version})
+        if self.similarity and self.embeddings is not None:
+            vector = self._embed(normalized)
+            with self._lock:
+                self._vectors[key] = vector
+                # keep the semantic index no larger than the memory tier
+                while len(self._vectors) > self.memory.maxsize:
+                    self._vectors.pop(next(iter(self._vectors)))
+
+    def stats(self):
+        hits = self.exact_hits + self.persistent_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            "size": len(self.memory),
+            "exact_hits": self.exact_hits,
+            "persistent_hits": self.persistent_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
@@ -0,0 +1,60 @@
+"""Per-session, token-bounded chat memory for the RAG chain.
+
+Each LangGraph thread (session) gets its own `ConversationTokenBufferMemory`, so users
+never see each other's history and the history sent to the condense-question prompt is
+capped at `max_token_limit` tokens. Sessions idle for longer than `idle_ttl` seconds are
+evicted, and at most `max_sessions` are kept (least recently used first out).
+"""
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from langchain.memory import ConversationTokenBufferMemory
+
+logger = logging.getLogger("file_api_logger")
+
+
+class SessionMemoryStore:
+    def __init__(self, llm, max_token_limit=1000, idle_ttl=1800, max_sessions=1000):
+        self.llm = llm  # only used to count tokens
+        self.max_token_limit = max_token_limit
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> (memory, last access), oldest access first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        """Return the memory of `session_id`, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.pop(session_id, None)
+            memory = entry[0] if entry else ConversationTokenBufferMemory(
+                llm=self.llm,
+                max_token_limit=self.max_token_limit,
+                memory_key="chat_history",
+                input_key="question",
+                output_key="answer",
+                return_messages=True,
+            )
+            self._sessions[session_id] = (memory, now)
+            return memory
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict(self, now):
+        expired = 0
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.idle_ttl and len(self._sessions) < self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            expired += 1
+        if expired:
+            logger.info(f"Evicted {expired} idle RAG sessions", extra={"api_path": "rag_memory"})
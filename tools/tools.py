@@ -1,64 +1,131 @@
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated
-import operator
-from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, ToolMessage
-from langchain_openai import ChatOpenAI
 #from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_tavily import TavilySearch
-from langchain_openai import ChatOpenAI
-from langchain.tools import tool
-from requests import Request, Session
-from requests.exceptions import ConnectionError, Timeout, TooManyRedirects
 import json #the format we want to retrieve
-import pprint
 from dotenv import load_dotenv
 import os
-from dotenv import load_dotenv
-from tools.rag_tool import qa_chain
+from tools.rag_tool import answer, aanswer
+from typing import Annotated
+from langchain_core.tools import StructuredTool, InjectedToolArg
+from tools.cache import SingleFlightCache
+from tools.coinmarketcap import CoinMarketCapClient, PriceNotFound
+from tools.qa_cache import normalize_question
 import requests
+import httpx
 
 load_dotenv()
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
 TAVILY_API_KEY=os.getenv("TAVILY_API_KEY")
 COINCAP_API_KEY=os.getenv("COINCAP_API_KEY")
 
-@tool
-def get_price(slug: str) -> str:
+# Prices are cached per slug: fresh for PRICE_CACHE_TTL seconds, then served stale (at most
+# PRICE_STALE_TTL seconds more) while one background call refreshes them
+price_cache = SingleFlightCache(
+    maxsize=int(os.getenv("PRICE_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("PRICE_CACHE_TTL", "30")),
+    stale_ttl=float(os.getenv("PRICE_STALE_TTL", "300")),
+    stale_wait=float(os.getenv("PRICE_STALE_WAIT", "0.5")),
+)
+
+
+# Shared keep-alive client; concurrent slugs are merged into one comma-separated quotes call
+cmc_client = CoinMarketCapClient(COINCAP_API_KEY)
+
+
+def _fetch_price(slug):
+      """Calls the CoinMarketCap quotes endpoint, raises on network errors or unknown slugs"""
+      return f"price: {cmc_client.price(slug)} USD"
+
+
+async def _afetch_price(slug):
+      return f"price: {await cmc_client.aprice(slug)} USD"
+
+
+def _price_error(slug, e):
+      """Tool output for a failed lookup, unexpected errors are re-raised"""
+      if isinstance(e, PriceNotFound):
+        return f"No price found for {slug}"
+      if isinstance(e, httpx.HTTPError):
+        print(e)
+        return f"CoinMarketCap network error: {e}"
+      if isinstance(e, (KeyError, TypeError, ValueError)):
+        return f"CoinMarketCap response error: {e}"
+      raise e
+
+
+def _get_price(slug: str) -> str:
       """Gets the current price of a given cryptocurrency based on a API
         Example input: bitcoin  , output: 118,205.23 USD
       """
       #print("[DEBUG] get_price called with slug:", slug)
+      slug = slug.strip().lower()
+      try:
+        result = price_cache.get(slug, lambda: _fetch_price(slug))
+        print(result)
+        return result
+      except Exception as e:
+        return _price_error(slug, e)
 
-      url = 'https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest'
-      parameters = {
-        'slug': slug,
-        'convert':'USD'
-      }
-      headers = {
-        'Accepts': 'application/json', #selects return format, we want json in response
-        'X-CMC_PRO_API_KEY': COINCAP_API_KEY,
-      } #header is for the things that dont change in differev=nt sessions
-
-      session = Session()
-      session.headers.update(headers) #adding the headers to the session
 
+async def _aget_price(slug: str) -> str:
+      slug = slug.strip().lower()
       try:
-        response = session.get(url, params=parameters)
-        data = json.loads(response.text)
-        slug_id=list(data["data"].keys())[0]
-        #print("[DEBUG] get_price returning result:", response)
-        #pprint.pprint(data["data"]["1"]["quote"]["USD"]["price"])
-        print(f"price: {data['data'][slug_id]['quote']['USD']['price']} USD")
-        return f"price: {data['data'][slug_id]['quote']['USD']['price']} USD"
-      except (ConnectionError, Timeout, TooManyRedirects) as e:
-        print(e)
+        result = await price_cache.aget(slug, lambda: _afetch_price(slug))
+        print(result)
+        return result
+      except Exception as e:
+        return _price_error(slug, e)
+
+
+# invoke() (sync CLI graph) blocks a worker thread, ainvoke() (MCP server, async graph) awaits the
+# price without blocking the event loop, so concurrent calls are coalesced and batched
+get_price = StructuredTool.from_function(func=_get_price, coroutine=_aget_price, name="get_price")
         
         
 tavily_tool = TavilySearch(max_results=2)
 
+# Search results are cached by normalized query; concurrent identical searches share one call
+search_cache = SingleFlightCache(
+    maxsize=int(os.getenv("TAVILY_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("TAVILY_CACHE_TTL", "3600")),
+    stale_ttl=0,
+)
+TAVILY_RESULT_CHARS = int(os.getenv("TAVILY_RESULT_CHARS", "800"))  # per result
+TAVILY_MAX_CHARS = int(os.getenv("TAVILY_MAX_CHARS", "3000"))  # whole tool output
+
+
+def _format_search(result):
+   """Keeps title, url and a truncated snippet of each result instead of the raw response"""
+   if not isinstance(result, dict) or "results" not in result:
+      return str(result)[:TAVILY_MAX_CHARS]
+   lines = []
+   for item in result["results"]:
+      content = (item.get("content") or "").strip()
+      if len(content) > TAVILY_RESULT_CHARS:
+         content = content[:TAVILY_RESULT_CHARS] + "..."
+      lines.append(f"{item.get('title', '')} ({item.get('url', '')}): {content}")
+   if result.get("answer"):
+      lines.insert(0, f"Answer: {result['answer']}")
+   return "\n\n".join(lines)[:TAVILY_MAX_CHARS]
+
+
+def _search_result(result):
+   """TavilySearch catches upstream errors and returns {"error": e}: raise it again, so it is never cached"""
+   if isinstance(result, dict) and "error" in result:
+      error = result["error"]
+      raise error if isinstance(error, Exception) else RuntimeError(str(error))
+   return _format_search(result)
+
+
+def _search_error(e):
+   if isinstance(e, json.JSONDecodeError):
+      return f"Tavily JSON error: {e}"
+   if isinstance(e, (requests.exceptions.RequestException, httpx.HTTPError)):
+      return f"Tavily network error: {e}"
+   return f"Tavily unknown error: {e}"
+
+
 # Wrap Tavily call to handle errors
-@tool
-def safe_tavily(query: str) -> str:
+def _safe_tavily(query: str) -> str:
    """does a tavily search based on the query
 
   Args:
@@ -67,26 +134,46 @@ def safe_tavily(query: str) -> str:
   Returns:
       str: search results
   """
+   normalized = normalize_question(query)
    try:
-      result = tavily_tool.invoke({"query": query})
-      return str(result)
-   except json.JSONDecodeError as e:
-      return f"Tavily JSON error: {e}"
-   except requests.exceptions.RequestException as e:
-      return f"Tavily network error: {e}"
+      return search_cache.get(normalized, lambda: _search_result(tavily_tool.invoke({"query": query})))
+   except Exception as e:
+      return _search_error(e)
+
+
+async def _asafe_tavily(query: str) -> str:
+   normalized = normalize_question(query)
+   try:
+      return await search_cache.aget(normalized, lambda: _asearch(query))
    except Exception as e:
-      return f"Tavily unknown error: {e}"
+      return _search_error(e)
+
+
+async def _asearch(query):
+   return _search_result(await tavily_tool.ainvoke({"query": query}))
+
 
-@tool
-def rag_qa(query: str) -> str:
+# async on the MCP server, so identical searches in flight at the same time share one Tavily call
+safe_tavily = StructuredTool.from_function(func=_safe_tavily, coroutine=_asafe_tavily, name="safe_tavily")
+
+# session_id is filled in by the agent from the LangGraph thread_id (graph.Agent) and hidden from the
+# LLM; it is a real argument, not the RunnableConfig, so that it also reaches the tool through MCP
+def _rag_qa(query: str, session_id: Annotated[str, InjectedToolArg] = "default") -> str:
   
     """
     Answer user questions based on indexed PDF about a network architecture called the Transformer, which is based on attention mechanisms and eliminates the need for recurrence and convolutions using RAG pipeline.
     Input: a user question (query)
     Output: answer string
     """
-    response = qa_chain.invoke(query)
-    return response["answer"] if "answer" in response else str(response)
+    return answer(query, session_id)
+
+
+async def _arag_qa(query: str, session_id: Annotated[str, InjectedToolArg] = "default") -> str:
+    return await aanswer(query, session_id)
+
+
+# invoke() runs the sync chain, ainvoke() the async one (async retriever, LLM and DB driver)
+rag_qa = StructuredTool.from_function(func=_rag_qa, coroutine=_arag_qa, name="rag_qa")
   
 TOOLs = [get_price,safe_tavily,rag_qa]
 